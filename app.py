@@ -5,6 +5,9 @@ import os
 from dotenv import load_dotenv
 from src.clarifier import Clarifier
 from src.planner import Planner
+from src.topic_cache import TopicCache
+from src.deadline import Deadline
+from src.endpoint_health import EndpointHealth
 
 # Load environment variables
 load_dotenv()
@@ -96,6 +99,26 @@ with st.sidebar:
     
     model_name = st.text_input("Model Name", value='deepseek-ai/DeepSeek-R1-Distill-Llama-8B')
 
+    use_cache = st.checkbox("Reuse results for similar topics", value=True)
+    cache_threshold = st.slider("Similarity threshold", min_value=0.5, max_value=1.0, value=0.7, step=0.05)
+    refresh_cache = st.checkbox("Refresh cached results in background", value=False)
+    deadline_seconds = st.number_input("Step deadline (seconds, 0 = none)", min_value=0, value=0, step=30)
+
+@st.cache_resource
+def get_topic_cache() -> TopicCache:
+    return TopicCache()
+
+@st.cache_resource
+def get_endpoint_health() -> EndpointHealth:
+    return EndpointHealth()
+
+endpoint_health = get_endpoint_health()
+
+topic_cache = None
+if use_cache:
+    topic_cache = get_topic_cache()
+    topic_cache.threshold = cache_threshold
+
 if not HF_KEY:
     st.warning("Please provide a HuggingFace API Token in the sidebar or .env file to proceed.")
     st.stop()
@@ -113,8 +136,8 @@ initial_topic = st.text_input("Enter your broad research topic:", placeholder="e
 if st.button("Clarify Topic"):
     if initial_topic:
         with st.spinner("Consulting with Clarifier Agent..."):
-            clarifier = Clarifier(model_name=model_name, hf_key=HF_KEY)
-            suggestions = clarifier.get_suggestions(initial_topic)
+            clarifier = Clarifier(model_name=model_name, hf_key=HF_KEY, cache=topic_cache, refresh_cache=refresh_cache, health=endpoint_health)
+            suggestions = clarifier.get_suggestions(initial_topic, deadline=Deadline(deadline_seconds or None))
             st.session_state.suggestions = suggestions
     else:
         st.error("Please enter a topic first.")
@@ -137,8 +160,8 @@ if st.session_state.suggestions:
     if st.button("Generate Research Plan"):
         if st.session_state.final_topic:
             with st.spinner("Planner Agent is creating your strategy..."):
-                planner = Planner(model_name=model_name, hf_key=HF_KEY)
-                plan = planner.plan(st.session_state.final_topic)
+                planner = Planner(model_name=model_name, hf_key=HF_KEY, cache=topic_cache, refresh_cache=refresh_cache, health=endpoint_health)
+                plan = planner.plan(st.session_state.final_topic, deadline=Deadline(deadline_seconds or None))
                 
                 st.markdown('<div class="sub-header">3. Research Plan</div>', unsafe_allow_html=True)
                 st.markdown(plan)
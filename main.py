@@ -7,11 +7,20 @@ os.environ['SSL_CERT_FILE'] = ""
 os.environ['REQUESTS_CA_BUNDLE'] = ""
 os.environ['CURL_CA_BUNDLE'] = ""
 import time
+import argparse
 from dotenv import load_dotenv
 from src.planner import Planner
 from src.clarifier import Clarifier
 from src.splitter import Splitter
 from src.coordinator import Coordinator
+from src.output_store import RunOutputStore
+from src.topic_cache import TopicCache
+from src.token_budget import TokenBudget
+from src.work_queue import WorkQueue
+from src.router import ModelRouter, LatencyStats
+from src.research_store import ResearchStore
+from src.deadline import Deadline, parse_duration
+from src.endpoint_health import EndpointHealth
 
 # Load environment variables from .env file
 load_dotenv()
@@ -25,50 +34,118 @@ PLANNER_MODEL = 'deepseek-ai/DeepSeek-R1-Distill-Llama-8B'
 SPLITTER_MODEL = 'deepseek-ai/DeepSeek-R1-Distill-Llama-8B'
 COORDINATOR_MODEL = 'MiniMaxAI/MiniMax-M1-80k'
 SUBAGENT_MODEL = 'MiniMaxAI/MiniMax-M1-80k'
+FAST_SUBAGENT_MODEL = 'Qwen/Qwen2.5-7B-Instruct'
+# Tried in order once a model's circuit breaker opens (endpoint down or model not served)
+FALLBACK_MODELS = {
+    'deepseek-ai/DeepSeek-R1-Distill-Llama-8B': ['Qwen/Qwen2.5-7B-Instruct'],
+    'MiniMaxAI/MiniMax-M1-80k': ['meta-llama/Llama-3.3-70B-Instruct', 'Qwen/Qwen2.5-Coder-32B-Instruct'],
+    'Qwen/Qwen2.5-7B-Instruct': ['meta-llama/Llama-3.3-70B-Instruct'],
+}
+SUBAGENT_LATENCY_SLO = float(os.getenv("SUBAGENT_LATENCY_SLO", "180"))
+ARCHIVE_RUNS = os.getenv("ARCHIVE_RUNS", "").lower() in ("1", "true", "yes")
+TOPIC_CACHE_THRESHOLD = float(os.getenv("TOPIC_CACHE_THRESHOLD", "0.7"))
+REFRESH_CACHED = os.getenv("REFRESH_CACHED", "").lower() in ("1", "true", "yes")
+RESEARCH_MAX_AGE_HOURS = float(os.getenv("RESEARCH_MAX_AGE_HOURS", "168"))
+# Set WORK_QUEUE to a shared SQLite path to run sub-agents on worker processes (python -m src.worker)
+WORK_QUEUE = os.getenv("WORK_QUEUE")
+# Fold each finding into a running draft as sub-agents finish; the end of the run only consolidates the draft
+PROGRESSIVE_SYNTHESIS = os.getenv("PROGRESSIVE_SYNTHESIS", "").lower() in ("1", "true", "yes")
 
 if __name__ == "__main__":
-    start_time = time.perf_counter()
+    parser = argparse.ArgumentParser(description="Deep Research Agent")
+    parser.add_argument(
+        "--deadline",
+        type=parse_duration,
+        default=os.getenv("RUN_DEADLINE"),
+        help="Wall-clock budget for the run after clarification, e.g. 300s or 10m. Unfinished subtasks are reported as missing.",
+    )
+    args = parser.parse_args()
+
+    store = None
+    # Ctrl+C while sub-agents run is handled by the coordinator (partial synthesis); anywhere else it ends the run
+    try:
+        start_time = time.perf_counter()
     
-    print("\n\033[93m--- Deep Research Agent ---\033[0m")
+        print("\n\033[93m--- Deep Research Agent ---\033[0m")
 
-    initial_topic = input("Enter a research topic: ")
+        initial_topic = input("Enter a research topic: ")
     
-    # Clarify Topic
-    clarifier = Clarifier(model_name=CLARIFIER_MODEL, hf_key=HF_KEY)
-    final_topic = clarifier.clarify(topic=initial_topic)
+        # Near-duplicate topics reuse earlier suggestions and plans instead of paying for the reasoning model again
+        topic_cache = TopicCache(threshold=TOPIC_CACHE_THRESHOLD)
+        # Shared token budget: prompts are sized locally before every call and usage is reported per stage
+        budget = TokenBudget()
+        # Shared endpoint health: once a model fails, every later stage skips it for its fallback
+        health = EndpointHealth(fallbacks=FALLBACK_MODELS)
+
+        # Clarify Topic
+        clarifier = Clarifier(model_name=CLARIFIER_MODEL, hf_key=HF_KEY, cache=topic_cache, refresh_cache=REFRESH_CACHED, budget=budget, health=health)
+        final_topic = clarifier.clarify(topic=initial_topic, deadline=Deadline(args.deadline))
+
+        # The run clock starts once the user has picked a topic; every later stage shares it
+        deadline = Deadline(args.deadline)
+        if args.deadline:
+            logger.info(f"Run deadline: {args.deadline:.0f}s")
 
-    planner = Planner(model_name=PLANNER_MODEL, hf_key=HF_KEY)
-    plan = planner.plan(topic=final_topic)
+        planner = Planner(model_name=PLANNER_MODEL, hf_key=HF_KEY, cache=topic_cache, refresh_cache=REFRESH_CACHED, budget=budget, health=health)
+        plan = planner.plan(topic=final_topic, deadline=deadline)
     
-    # Save research plan
-    os.makedirs("research_outputs", exist_ok=True)
-    with open("research_outputs/research_plan.txt", "w", encoding="utf-8") as f:
-        f.write(plan)
-    logger.info("Research plan saved to research_outputs/research_plan.txt")
+        # Every run writes into its own directory so concurrent runs never overwrite each other
+        store = RunOutputStore()
 
-    splitter = Splitter(model_name=SPLITTER_MODEL, hf_key=HF_KEY)
-    subtasks = splitter.split(plan)
+        # Save research plan
+        path = store.write("research_plan.txt", plan)
+        logger.info(f"Research plan saved to {path}")
 
-    if not subtasks:
-        logger.error("No subtasks generated. Exiting.")
-        exit(1)
-        
-    # Save subtasks
-    with open("research_outputs/subtasks.txt", "w", encoding="utf-8") as f:
-        f.write(json.dumps(subtasks, indent=2))
-    logger.info("Subtasks saved to research_outputs/subtasks.txt")
+        splitter = Splitter(model_name=SPLITTER_MODEL, hf_key=HF_KEY, budget=budget, health=health)
+        subtasks = splitter.split(plan, deadline=deadline)
 
-    coordinator = Coordinator(
-        model_name=COORDINATOR_MODEL, 
-        subagent_model_id=SUBAGENT_MODEL,
-        hf_key=HF_KEY
-    )
-    report = coordinator.coordinate(user_query=final_topic, research_plan=plan, subtasks=subtasks)
+        if not subtasks:
+            logger.error("No subtasks generated. Exiting.")
+            store.close()
+            exit(1)
+        
+        # Save subtasks
+        path = store.write("subtasks.txt", json.dumps(subtasks, indent=2))
+        logger.info(f"Subtasks saved to {path}")
 
-    print("\n\033[93m--- Final Research Report ---\033[0m")
-    print(report)
-    print("\033[93m-----------------------------\033[0m")
+        coordinator = Coordinator(
+            model_name=COORDINATOR_MODEL, 
+            subagent_model_id=SUBAGENT_MODEL,
+            hf_key=HF_KEY,
+            budget=budget,
+            health=health,
+            progressive_synthesis=PROGRESSIVE_SYNTHESIS,
+            work_queue=WorkQueue(WORK_QUEUE) if WORK_QUEUE else None,
+            # Simple look-up subtasks go to the fast model; reasoning-heavy ones to the large model within the SLO
+            # With a work queue, latency is read from the queue database where the workers record it
+            router=ModelRouter(
+                fast_model=FAST_SUBAGENT_MODEL, large_model=SUBAGENT_MODEL, latency_slo=SUBAGENT_LATENCY_SLO,
+                stats=LatencyStats(WORK_QUEUE) if WORK_QUEUE else None,
+            ),
+            # Re-runs of a topic only send stale or new subtasks to sub-agents
+            research_store=ResearchStore(max_age=RESEARCH_MAX_AGE_HOURS * 3600),
+        )
+        # The report is streamed to the console and the run's final_report.md as it is generated
+        # Ctrl+C during research stops the sub-agents and synthesizes what has been found so far
+        report = coordinator.coordinate(
+            user_query=final_topic, research_plan=plan, subtasks=subtasks, output_store=store, deadline=deadline
+        )
+        archive_path = store.close(archive=ARCHIVE_RUNS)
+        if archive_path:
+            logger.info(f"Run archived to {archive_path}")
+        ttfb = coordinator.metrics.get("time_to_first_report_byte")
+        if ttfb is not None:
+            logger.info(f"Time to first report byte: {ttfb:.2f}s")
+        if coordinator.metrics.get("subtasks_missing"):
+            logger.warning(f"{coordinator.metrics['subtasks_missing']} subtasks missing from the report ({deadline.reason or 'run deadline reached'})")
     
-    elapsed_time = time.perf_counter() - start_time
-    print(f"\n\033[93m--- Research complete ({elapsed_time:.2f}s) ---\033[0m")
-    logger.info(f"Research planning took {elapsed_time:.2f} seconds.")
\ No newline at end of file
+        budget.log_summary()
+        coordinator.search_policy.log_summary()
+        elapsed_time = time.perf_counter() - start_time
+        print(f"\n\033[93m--- Research complete ({elapsed_time:.2f}s) ---\033[0m")
+        logger.info(f"Research planning took {elapsed_time:.2f} seconds.")
+    except KeyboardInterrupt:
+        logger.warning("Interrupted by user; stopping without a final report")
+        if store is not None:
+            store.close()
+        exit(130)
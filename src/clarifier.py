@@ -1,12 +1,23 @@
 import logging
 import time
-import json
-from typing import List, Dict
+import threading
+from typing import List, Dict, Optional
+from pydantic import BaseModel, Field
 from huggingface_hub import InferenceClient
 from .prompts import CLARIFIER_DIRECTION
+from .topic_cache import TopicCache
+from .token_budget import TokenBudget, BudgetExceeded
+from .structured import StructuredOutputParser
+from .streaming import StreamAccumulator
+from .deadline import Deadline
+from .endpoint_health import EndpointHealth
 
 logger = logging.getLogger(__name__)
 
+class Suggestion(BaseModel):
+    title: str = Field(..., description="Clear, specific title of the research direction.")
+    description: str = Field(..., description="One-sentence description of the focus.")
+
 CLARIFICATION_SCHEMA = {
     "name": "clarification_suggestions",
     "schema": {
@@ -30,29 +41,78 @@ CLARIFICATION_SCHEMA = {
 }
 
 class Clarifier:
-    def __init__(self, model_name: str, hf_key: str):
+    def __init__(
+        self,
+        model_name: str,
+        hf_key: str,
+        cache: Optional[TopicCache] = None,
+        refresh_cache: bool = False,
+        budget: Optional[TokenBudget] = None,
+        health: Optional[EndpointHealth] = None,
+    ):
         self.model_name = model_name
-        self.client = InferenceClient(token=hf_key, timeout=120)
+        self.request_timeout = 120
+        self.client = InferenceClient(token=hf_key, timeout=self.request_timeout)
+        self.budget = budget or TokenBudget()
+        self.health = health or EndpointHealth()
+        self.parser = StructuredOutputParser(Suggestion, "suggestions")
+        self.cache = cache
+        self.refresh_cache = refresh_cache
+
+    def get_suggestions(self, topic: str, deadline: Optional[Deadline] = None) -> List[Dict[str, str]]:
+        if self.cache:
+            cached = self.cache.lookup("suggestions", topic)
+            if cached:
+                if self.refresh_cache:
+                    threading.Thread(target=self._generate_suggestions, args=(topic,), daemon=True).start()
+                return cached
+        return self._generate_suggestions(topic, deadline)
 
-    def get_suggestions(self, topic: str) -> List[Dict[str, str]]:
+    def _generate_suggestions(self, topic: str, deadline: Optional[Deadline] = None) -> List[Dict[str, str]]:
+        deadline = deadline or Deadline()
         logger.info(f'Clarifying Topic: {topic} using model {self.model_name}')
+
+        base_messages = [
+            {"role": "system", "content": CLARIFIER_DIRECTION},
+            {"role": "user", "content": topic},
+        ]
+        try:
+            messages, max_tokens = self.budget.fit("clarifier", self.model_name, base_messages, max_output_tokens=2000)
+        except BudgetExceeded as e:
+            logger.error(f"Skipping clarification: {e}")
+            return []
         
+        fitted_model = self.model_name
         max_retries = 3
         for attempt in range(max_retries):
+            if deadline.expired():
+                logger.warning("Run deadline reached during clarification")
+                break
+            # An open circuit skips the model (or fails over to its fallback) without waiting on timeouts
+            model = self.health.select(self.model_name)
+            if model is None:
+                break
+            if model != fitted_model:
+                # A fallback can have a smaller context window than the primary model
+                try:
+                    messages, max_tokens = self.budget.fit("clarifier", model, base_messages, max_output_tokens=2000)
+                except BudgetExceeded as e:
+                    logger.error(f"Cannot fail over to {model}: {e}")
+                    break
+                fitted_model = model
+            self.client.timeout = deadline.timeout(self.health.timeout(model, self.request_timeout))
             try:
-                logger.info(f"Attempt {attempt + 1}/{max_retries} using {self.model_name}")
+                logger.info(f"Attempt {attempt + 1}/{max_retries} using {model}")
                 
                 # Use streaming to be more resilient to StopIteration/timeout issues on thinking models
-                full_content = ""
+                accumulator = StreamAccumulator()
+                stream_error = None
                 try:
                     # Note: response_format is used to guide the model, but we'll parse manually for robustness
                     stream = self.client.chat_completion(
-                        model=self.model_name,
-                        messages=[
-                            {"role": "system", "content": CLARIFIER_DIRECTION},
-                            {"role": "user", "content": topic}
-                        ],
-                        max_tokens=2000,
+                        model=model,
+                        messages=messages,
+                        max_tokens=max_tokens,
                         stream=True,
                         temperature=1.0,
                         top_p=1.0,
@@ -63,50 +123,44 @@ class Clarifier:
                         } if attempt == 0 else None
                     )
                     
-                    for chunk in stream:
-                        delta = chunk.choices[0].delta
-                        if hasattr(delta, 'content') and delta.content:
-                            full_content += delta.content
-                        # Capture DeepSeek-R1 style reasoning_content
-                        if hasattr(delta, 'reasoning_content') and delta.reasoning_content:
-                            # Wrap in think tags if not already present in the stream to satisfy our parsers
-                            if "<think>" not in full_content:
-                                full_content += "<think>"
-                            full_content += delta.reasoning_content
-                        elif hasattr(delta, 'reasoning') and delta.reasoning:
-                            if "<think>" not in full_content:
-                                full_content += "<think>"
-                            full_content += delta.reasoning
-                    
-                    # Close think tag if it was opened but never closed by the model
-                    if "<think>" in full_content and "</think>" not in full_content:
-                        full_content += "</think>"
+                    accumulator.consume(stream, deadline)
                 
                 except StopIteration:
-                    if not full_content:
-                        logger.error(f"Model {self.model_name} returned an empty stream. It may not be supported on the current Inference API endpoint.")
+                    if not accumulator.text:
+                        logger.error(f"Model {model} returned an empty stream. It may not be supported on the current Inference API endpoint.")
                     else:
                         logger.warning("Stream ended abruptly.")
                 except Exception as stream_err:
-                    logger.error(f"Streaming error from {self.model_name}: {stream_err}")
+                    logger.error(f"Streaming error from {model}: {stream_err}")
+                    self.health.record_failure(model, stream_err)
+                    stream_error = stream_err
                 
+                full_content = accumulator.close()
                 if not full_content:
+                    if stream_error is None:
+                        self.health.record_failure(model, f"{model} returned an empty stream")
                     logger.warning(f"No content received on attempt {attempt + 1}")
                     if attempt < max_retries - 1:
-                        time.sleep(2 ** attempt)
+                        time.sleep(deadline.timeout(self.health.backoff(model, 2 ** attempt), minimum=0))
                         continue
                     return []
+                # Content that arrived before a stream error does not make the endpoint healthy again
+                if stream_error is None:
+                    self.health.record_success(model)
 
                 suggestions = self._parse_suggestions(full_content)
                 if suggestions:
+                    if self.cache:
+                        self.cache.store("suggestions", topic, suggestions)
                     return suggestions
                 
                 logger.warning(f"Failed to parse suggestions from content on attempt {attempt + 1}")
 
             except Exception as e:
                 logger.error(f"Error during get_suggestions (Attempt {attempt + 1}): {e}")
+                self.health.record_failure(model, e)
                 if attempt < max_retries - 1:
-                    wait_time = 2 ** attempt
+                    wait_time = deadline.timeout(self.health.backoff(model, 2 ** attempt), minimum=0)
                     logger.info(f"Retrying in {wait_time} seconds...")
                     time.sleep(wait_time)
         
@@ -117,55 +171,13 @@ class Clarifier:
             return []
             
         logger.debug(f"Raw response: {content}")
-        
-        # Clean the content: remove thinking blocks and extract JSON
-        clean_content = content.strip()
-        
-        # Remove thinking blocks if present
-        if "<think>" in clean_content:
-            if "</think>" in clean_content:
-                clean_content = clean_content.split("</think>")[-1].strip()
-            else:
-                # If think is open but not closed, try to find the first JSON object after it
-                parts = clean_content.split("<think>")
-                clean_content = parts[-1].strip()
-                if "{" in clean_content:
-                    clean_content = "{" + clean_content.split("{", 1)[1]
-
-        # Extract JSON from potential code blocks
-        if "```json" in clean_content:
-            clean_content = clean_content.split("```json")[1].split("```")[0].strip()
-        elif "```" in clean_content:
-            # Check if it looks like JSON inside a generic code block
-            block_content = clean_content.split("```")[1].split("```")[0].strip()
-            if block_content.startswith("{") or "[" in block_content:
-                clean_content = block_content
-
-        # Final attempt to find a JSON-like structure if it's buried in text
-        if not (clean_content.startswith("{") or clean_content.startswith("[")):
-            if "{" in clean_content:
-                clean_content = "{" + clean_content.split("{", 1)[1]
-            if "}" in clean_content:
-                clean_content = clean_content.rsplit("}", 1)[0] + "}"
-
-        try:
-            data = json.loads(clean_content)
-            # Handle potential nested 'suggestions' key or direct list
-            if isinstance(data, dict):
-                suggestions = data.get("suggestions", [])
-            elif isinstance(data, list):
-                suggestions = data
-            else:
-                suggestions = []
-                
+        suggestions = self.parser.parse(content).items
+        if suggestions:
             logger.info(f"Successfully extracted {len(suggestions)} suggestions")
-            return suggestions
-        except json.JSONDecodeError as e:
-            logger.error(f"JSON parsing failed: {e}. Snippet: {clean_content[:150]}...")
-            return []
+        return suggestions
 
-    def clarify(self, topic: str) -> str:
-        suggestions = self.get_suggestions(topic)
+    def clarify(self, topic: str, deadline: Optional[Deadline] = None) -> str:
+        suggestions = self.get_suggestions(topic, deadline)
         
         if not suggestions:
             logger.warning("No suggestions generated, using original topic.")
@@ -1,11 +1,17 @@
 import os
 import json
+import queue
 import logging
 import time
-from typing import List, Dict
+import threading
+from typing import Callable, Iterator, List, Dict, Optional, Tuple
 import truststore
 truststore.inject_into_ssl()
-import winsound
+try:
+    import winsound
+except ImportError:
+    # Not available outside Windows (e.g. queue workers on Linux hosts)
+    winsound = None
 
 # Set environment variables to help with corporate proxies
 os.environ['SSL_CERT_FILE'] = ""  # Force use of system store
@@ -13,7 +19,17 @@ os.environ['REQUESTS_CA_BUNDLE'] = ""
 os.environ['CURL_CA_BUNDLE'] = ""
 
 from smolagents import InferenceClientModel, tool, ToolCallingAgent
-from .prompts import COORDINATOR_DIRECTION, SUBAGENT_DIRECTION
+from .prompts import COORDINATOR_DIRECTION, SUBAGENT_DIRECTION, DRAFT_FOLD_DIRECTION, CONSOLIDATOR_DIRECTION
+from .streaming import ReportStreamWriter
+from .output_store import RunOutputStore
+from .token_budget import TokenBudget, BudgetExceeded, compact_sections
+from .work_queue import WorkQueue, DONE, FAILED
+from .router import ModelRouter, LatencyStats
+from .research_store import ResearchStore
+from .deadline import Deadline, DeadlineExceeded
+from .search_policy import AdaptiveSearchPolicy
+from .endpoint_health import EndpointHealth, EndpointUnavailable
+from .progressive import ProgressiveDraft
 from tavily import TavilyClient
 
 logger = logging.getLogger(__name__)
@@ -23,27 +39,458 @@ class Coordinator:
         self, 
         model_name: str = "Qwen/Qwen2.5-Coder-32B-Instruct",
         subagent_model_id: str = "Qwen/Qwen2.5-Coder-32B-Instruct",
-        hf_key: str = None
+        hf_key: str = None,
+        budget: Optional[TokenBudget] = None,
+        synthesis_max_tokens: int = 8000,
+        work_queue: Optional[WorkQueue] = None,
+        distributed_timeout: Optional[float] = None,
+        router: Optional[ModelRouter] = None,
+        latency_stats: Optional[LatencyStats] = None,
+        research_store: Optional[ResearchStore] = None,
+        max_parallel_subagents: int = 4,
+        synthesis_reserve: float = 60,
+        synthesis_share: float = 0.3,
+        health: Optional[EndpointHealth] = None,
+        progressive_synthesis: bool = False,
     ):
         self.hf_key = hf_key or os.getenv("HF_KEY") or os.getenv("HF_TOKEN")
-        self.coordinator_model = InferenceClientModel(
-            model_id=model_name,
-            api_key=self.hf_key,
-        )
-        self.subagent_model = InferenceClientModel(
-            model_id=subagent_model_id,
-            api_key=self.hf_key,
-        )
+        self.model_name = model_name
+        self.budget = budget or TokenBudget()
+        self.synthesis_max_tokens = synthesis_max_tokens
+        self.subagent_model_id = subagent_model_id
+        self._models = {}
+        self._models_lock = threading.Lock()
+        # Shared circuit breakers: a dead endpoint fails over to its fallback model instead of timing out again
+        self.health = health or EndpointHealth()
+        # Fold findings into a running draft as sub-agents finish, leaving only a consolidation pass at the end
+        self.progressive_synthesis = progressive_synthesis
+        self._drafter = None
+        # With a work queue, sub-agents run on worker processes (python -m src.worker) instead of in-process
+        self.work_queue = work_queue
+        self.distributed_timeout = distributed_timeout
+        # Optional per-subtask model routing; without a router every sub-agent uses subagent_model_id
+        self.router = router
+        # Sub-agent latency is recorded against the model that actually ran, after any failover
+        self.latency_stats = latency_stats or (router.stats if router else None)
+        # Cross-run store: fresh findings from earlier runs on a similar topic are reused instead of re-researched
+        self.research_store = research_store
+        self.max_parallel_subagents = max_parallel_subagents
+        # Seconds of the run deadline kept back for the final synthesis, capped at a share of the time left
+        self.synthesis_reserve = synthesis_reserve
+        self.synthesis_share = synthesis_share
+        self._active_agents = set()
+        self._agents_lock = threading.Lock()
         
         self.tavily_key = os.getenv("TAVILY_API_KEY")
         if not self.tavily_key:
             raise ValueError("TAVILY_API_KEY environment variable is missing.")
         
         self.tavily_client = TavilyClient(api_key=self.tavily_key)
+        # Basic-depth search first; advanced depth or more results only when the hits look off-topic
+        self.search_policy = AdaptiveSearchPolicy(self.tavily_client)
+        self.metrics = {}
 
-    def coordinate(self, user_query: str, research_plan: str, subtasks: List[Dict]) -> str:
+    def coordinate(
+        self,
+        user_query: str,
+        research_plan: str,
+        subtasks: List[Dict],
+        stream_synthesis: bool = True,
+        on_token: Optional[Callable[[str], None]] = None,
+        output_store: Optional[RunOutputStore] = None,
+        deadline: Optional[Deadline] = None,
+    ) -> str:
         logger.info("Initializing Coordinator and sub-agents...")
+        owns_store = output_store is None
+        store = output_store or RunOutputStore()
+        try:
+            return self._coordinate(
+                user_query, research_plan, subtasks, store, stream_synthesis, on_token, deadline or Deadline()
+            )
+        finally:
+            if owns_store:
+                store.close()
+
+    def _coordinate(
+        self,
+        user_query: str,
+        research_plan: str,
+        subtasks: List[Dict],
+        store: RunOutputStore,
+        stream_synthesis: bool,
+        on_token: Optional[Callable[[str], None]],
+        deadline: Deadline,
+    ) -> str:
+        reused = {}
+        if self.research_store:
+            reused = self.research_store.match(user_query, subtasks)
+            self.research_store.save_run(store.run_id, user_query, research_plan, subtasks)
+        pending = [(i, task) for i, task in enumerate(subtasks) if i not in reused]
+
+        # Sub-agents must finish early enough to leave the synthesis its share of the run deadline
+        subagent_deadline = deadline.reserve(self.synthesis_reserve, self.synthesis_share)
+        if not pending:
+            outcomes = iter(())
+        elif self.work_queue is not None:
+            outcomes = self._run_distributed(user_query, research_plan, pending, store.run_id, subagent_deadline)
+        else:
+            outcomes = self._run_parallel(user_query, research_plan, pending, subagent_deadline)
+
+        drafter = None
+        if self.progressive_synthesis:
+            drafter = ProgressiveDraft(
+                fold=lambda draft, batch: self._fold_findings(user_query, research_plan, subtasks, draft, batch),
+                on_update=lambda draft: store.write("draft_report.md", draft),
+            )
+            self._drafter = drafter
+
+        findings_by_position = {}
+        drafted = set()
+        for position, stored in reused.items():
+            task = subtasks[position]
+            researched = time.strftime("%Y-%m-%d %H:%M", time.localtime(stored["researched_at"]))
+            findings_by_position[position] = (
+                f"FINDINGS FOR TASK {task.get('id')}: {task.get('title')} (reused from research on {researched})\n\n"
+                f"{stored['finding']}"
+            )
+            store.write(store.unique_name(f"subtask_{task.get('id')}.txt"), stored["finding"])
+            if drafter:
+                drafter.add(findings_by_position[position])
+                drafted.add(position)
+
+        missing = []
+        researched = 0
+        # Ctrl+C while a result is being handled (rather than awaited) still ends in a partial synthesis
+        while True:
+            try:
+                for position, task, finding, error in outcomes:
+                    subtask_id = task.get('id')
+                    title = task.get('title')
+                    if isinstance(error, DeadlineExceeded):
+                        missing.append(task)
+                        findings_by_position[position] = f"FINDINGS FOR TASK {subtask_id}: {title}\n\nMISSING: {error}. No findings are available for this subtask."
+                        continue
+                    if error is not None:
+                        logger.error(f"Error in sub-agent {subtask_id}: {error}")
+                        findings_by_position[position] = f"FINDINGS FOR TASK {subtask_id}: {title}\n\nERROR: Failed to complete task. {error}"
+                        continue
+
+                    researched += 1
+                    findings_by_position[position] = f"FINDINGS FOR TASK {subtask_id}: {title}\n\n{finding}"
+                    # Save individual sub-agent finding in the background
+                    path = store.write(store.unique_name(f"subtask_{subtask_id}.txt"), finding)
+                    logger.info(f"Sub-agent for {subtask_id} complete. Finding saved to {path}")
+                    if self.research_store:
+                        self.research_store.save_finding(store.run_id, position, task, finding)
+                    if drafter:
+                        drafter.add(findings_by_position[position])
+                        drafted.add(position)
+                    if winsound:
+                        winsound.Beep(1000, 500)
+                break
+            except KeyboardInterrupt:
+                deadline.cancel("interrupted by user")
+
+        self.metrics["subtasks_reused"] = len(reused)
+        self.metrics["subtasks_researched"] = researched
+        self.metrics["subtasks_missing"] = len(missing)
+        findings = [findings_by_position[i] for i in sorted(findings_by_position)]
 
+        draft, unfolded = "", findings
+        if drafter:
+            draft, unfolded = drafter.close(timeout=deadline.timeout(None, minimum=0))
+            unfolded += [findings_by_position[i] for i in sorted(findings_by_position) if i not in drafted]
+            self.metrics["draft_folds"] = drafter.folds
+            if not draft:
+                logger.warning("No draft report was built; synthesizing from the raw findings")
+                unfolded = findings
+
+        if draft:
+            # Only the consolidation of the running draft is left on the critical path
+            logger.info(f"Consolidating draft report ({drafter.folds} folds, {len(unfolded)} findings not yet in the draft)...")
+            system_prompt = CONSOLIDATOR_DIRECTION.format(
+                user_query=user_query,
+                research_plan=research_plan,
+                subtasks_json=json.dumps(subtasks, indent=2)
+            )
+            user_prompt = f"Here is the draft report assembled from the sub-agent findings as they arrived. Please consolidate it into the final research report as per the original project guidelines.\n\nDRAFT REPORT:\n{draft}\n\n"
+        else:
+            # Final Synthesis using the model directly
+            logger.info("Synthesizing final report...")
+            system_prompt = COORDINATOR_DIRECTION.format(
+                user_query=user_query,
+                research_plan=research_plan,
+                subtasks_json=json.dumps(subtasks, indent=2)
+            )
+            user_prompt = "Here are the findings from the specialized sub-agents. Please synthesize them into a cohesive final research report as per the original project guidelines.\n\n"
+        
+        synthesis_input = "\n\n".join(findings)
+        appendix = ""
+        if missing:
+            missing_list = "\n".join(f"- **{task.get('id')}**: {task.get('title')}" for task in missing)
+            user_prompt += f"NOTE: These subtasks did not finish before the run deadline and have no findings. State clearly in the report which areas are missing:\n{missing_list}\n\n"
+            appendix = f"\n\n## Missing Research\n\nThe run stopped ({deadline.reason or 'deadline reached'}) before these subtasks completed, so the report does not cover them:\n\n{missing_list}\n"
+        if not draft:
+            user_prompt += "SUB-AGENT FINDINGS:\n"
+        elif unfolded:
+            user_prompt += "FINDINGS NOT YET IN THE DRAFT:\n"
+
+        # Compact each finding evenly so the synthesis prompt fits the coordinator's context window
+        available = self.budget.available_input_tokens(
+            self.model_name,
+            [{"role": "system", "content": system_prompt}, {"role": "user", "content": user_prompt}],
+            self.synthesis_max_tokens,
+        )
+        prompt_findings = compact_sections(unfolded, max(available, 0))
+        
+        try:
+            messages, max_tokens = self.budget.fit(
+                "synthesis",
+                self.model_name,
+                [
+                    {"role": "system", "content": system_prompt},
+                    {"role": "user", "content": user_prompt + "\n\n".join(prompt_findings)}
+                ],
+                max_output_tokens=self.synthesis_max_tokens,
+            )
+        except BudgetExceeded as e:
+            logger.error(f"Cannot synthesize final report: {e}")
+            return self._fallback_report(e, synthesis_input) + appendix
+
+        if stream_synthesis:
+            return self._stream_synthesis(messages, max_tokens, synthesis_input, store, on_token, deadline, appendix)
+
+        try:
+            final_report = self._complete("synthesis", messages, max_tokens) + appendix
+            
+            # Save final report
+            path = store.write_now("final_report.md", final_report)
+            logger.info(f"Final report saved to {path}")
+                    
+            return final_report
+        except Exception as e:
+            logger.error(f"Error during final synthesis: {e}")
+            return self._fallback_report(e, synthesis_input) + appendix
+
+    def interim_report(self) -> str:
+        # Latest progressive draft; safe to call from another thread while coordinate() is running
+        return self._drafter.snapshot() if self._drafter else ""
+
+    def _fold_findings(
+        self,
+        user_query: str,
+        research_plan: str,
+        subtasks: List[Dict],
+        draft: str,
+        batch: List[str],
+    ) -> str:
+        system_prompt = DRAFT_FOLD_DIRECTION.format(
+            user_query=user_query,
+            research_plan=research_plan,
+            subtasks_json=json.dumps(subtasks, indent=2)
+        )
+        user_prompt = f"CURRENT DRAFT:\n{draft or '(empty: start the draft from these findings)'}\n\nNEW FINDINGS:\n"
+        available = self.budget.available_input_tokens(
+            self.model_name,
+            [{"role": "system", "content": system_prompt}, {"role": "user", "content": user_prompt}],
+            self.synthesis_max_tokens,
+        )
+        messages, max_tokens = self.budget.fit(
+            "draft",
+            self.model_name,
+            [
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": user_prompt + "\n\n".join(compact_sections(batch, max(available, 0)))}
+            ],
+            max_output_tokens=self.synthesis_max_tokens,
+        )
+        return self._complete("draft", messages, max_tokens)
+
+    def _complete(self, stage: str, messages: List[Dict], max_tokens: int) -> str:
+        # Blocking coordinator-model call with circuit-breaker failover
+        model = self.health.select(self.model_name)
+        if model is None:
+            raise EndpointUnavailable(f"No healthy endpoint for {self.model_name} or its fallbacks")
+        messages, max_tokens = self._refit(stage, model, messages, max_tokens)
+        try:
+            response = self._get_model(model)(messages=messages, max_tokens=max_tokens)
+        except Exception as e:
+            self.health.record_failure(model, e)
+            raise
+        self.health.record_success(model)
+        return self._strip_thinking(response.content or "")
+
+    def run_subtask(
+        self,
+        user_query: str,
+        research_plan: str,
+        task: Dict,
+        model_id: Optional[str] = None,
+        deadline: Optional[Deadline] = None,
+    ) -> str:
+        subtask_id = task.get('id')
+        requested = model_id or self.subagent_model_id
+        model_id = self.health.select(requested)
+        if model_id is None:
+            raise EndpointUnavailable(f"No healthy endpoint for {requested} or its fallbacks")
+        logger.info(f"Starting sub-agent for task: {subtask_id} using {model_id}")
+
+        subagent = ToolCallingAgent(
+            tools=[self._build_web_search(deadline or Deadline())],
+            model=self._get_model(model_id),
+            add_base_tools=False,
+            name=f"subagent_{subtask_id}",
+            max_steps=1,
+        )
+        
+        subagent_prompt = SUBAGENT_DIRECTION.format(
+            user_query=user_query,
+            research_plan=research_plan,
+            subtask_id=subtask_id,
+            subtask_title=task.get('title'),
+            subtask_description=task.get('description'),
+        )
+        with self._agents_lock:
+            self._active_agents.add(subagent)
+        start_time = time.perf_counter()
+        try:
+            finding = str(subagent.run(subagent_prompt))
+        except Exception as e:
+            self.health.record_failure(model_id, e)
+            if self.latency_stats:
+                self.latency_stats.record(model_id, time.perf_counter() - start_time, success=False)
+            raise
+        finally:
+            with self._agents_lock:
+                self._active_agents.discard(subagent)
+        self.health.record_success(model_id)
+        if self.latency_stats:
+            self.latency_stats.record(model_id, time.perf_counter() - start_time)
+        return finding
+
+    def interrupt_subagents(self) -> None:
+        # Agents stop between steps; a model call already in flight still runs to completion
+        with self._agents_lock:
+            for agent in self._active_agents:
+                agent.interrupt()
+
+    def _run_local(
+        self,
+        user_query: str,
+        research_plan: str,
+        task: Dict,
+        deadline: Optional[Deadline] = None,
+    ) -> Tuple[Dict, Optional[str], Optional[Exception]]:
+        model_id = self.router.route(task) if self.router else self.subagent_model_id
+        try:
+            return task, self.run_subtask(user_query, research_plan, task, model_id=model_id, deadline=deadline), None
+        except Exception as e:
+            return task, None, e
+
+    def _run_parallel(
+        self,
+        user_query: str,
+        research_plan: str,
+        items: List[Tuple[int, Dict]],
+        deadline: Deadline,
+    ) -> Iterator[Tuple[int, Dict, Optional[str], Optional[Exception]]]:
+        work = queue.Queue()
+        for item in items:
+            work.put(item)
+        done = queue.Queue()
+        stopped = threading.Event()
+
+        def drain() -> None:
+            while not stopped.is_set() and not deadline.expired():
+                try:
+                    position, task = work.get_nowait()
+                except queue.Empty:
+                    return
+                done.put((position,) + self._run_local(user_query, research_plan, task, deadline))
+
+        # Daemon threads rather than a ThreadPoolExecutor, whose threads are joined at interpreter exit:
+        # a sub-agent stuck in a model call must not keep the process alive after the report is written
+        for i in range(0 if deadline.expired() else min(self.max_parallel_subagents, len(items))):
+            threading.Thread(target=drain, name=f"subagent-{i}", daemon=True).start()
+
+        unfinished = dict(items)
+        try:
+            while unfinished and not deadline.expired():
+                remaining = deadline.remaining()
+                try:
+                    position, task, finding, error = done.get(timeout=None if remaining is None else max(remaining, 0))
+                except queue.Empty:
+                    continue
+                del unfinished[position]
+                yield position, task, finding, error
+        except KeyboardInterrupt:
+            deadline.cancel("interrupted by user")
+        stopped.set()
+
+        if unfinished:
+            # Stop waiting: interrupt running agents between steps and leave the ones not yet started unclaimed
+            logger.warning(f"Cancelling {len(unfinished)} unfinished sub-agent(s): {deadline.reason or 'run deadline reached'}")
+            self.interrupt_subagents()
+            for position in sorted(unfinished):
+                yield position, unfinished[position], None, DeadlineExceeded(f"Subtask not completed ({deadline.reason or 'run deadline reached'})")
+
+    def _run_distributed(
+        self,
+        user_query: str,
+        research_plan: str,
+        items: List[Tuple[int, Dict]],
+        run_id: str,
+        deadline: Deadline,
+    ) -> Iterator[Tuple[int, Dict, Optional[str], Optional[Exception]]]:
+        # Workers on any host sharing the queue claim and run the subtasks; we only collect results
+        positions = [position for position, _ in items]
+        subtasks = [task for _, task in items]
+        self.work_queue.publish(run_id, subtasks, {
+            "user_query": user_query,
+            "research_plan": research_plan,
+            "model_id": self.subagent_model_id,
+        }, task_payloads=[{"model_id": self.router.route(task)} for task in subtasks] if self.router else None)
+
+        # Yield each result as soon as a worker finishes it so progressive synthesis can fold it right away
+        collected = set()
+        timeout = deadline.timeout(self.distributed_timeout, minimum=0)
+        try:
+            for row in self.work_queue.watch(run_id, timeout=timeout, stop=deadline.expired):
+                collected.add(row["position"])
+                yield self._distributed_outcome(positions[row["position"]], row, deadline)
+        except KeyboardInterrupt:
+            deadline.cancel("interrupted by user")
+
+        rows = [row for row in self.work_queue.results(run_id) if row["position"] not in collected]
+        for row in rows:
+            yield self._distributed_outcome(positions[row["position"]], row, deadline)
+        if any(row["status"] not in (DONE, FAILED) for row in rows):
+            self.work_queue.cancel(run_id)
+
+    @staticmethod
+    def _distributed_outcome(
+        position: int,
+        row: Dict,
+        deadline: Deadline,
+    ) -> Tuple[int, Dict, Optional[str], Optional[Exception]]:
+        if row["status"] == DONE:
+            return position, row["task"], row["result"], None
+        if row["status"] == FAILED:
+            return position, row["task"], None, row["error"]
+        if deadline.expired():
+            return position, row["task"], None, DeadlineExceeded(f"Subtask not completed ({deadline.reason or 'run deadline reached'})")
+        return position, row["task"], None, f"Subtask still {row['status']} when collection stopped"
+
+    def _get_model(self, model_id: str) -> InferenceClientModel:
+        with self._models_lock:
+            if model_id not in self._models:
+                self._models[model_id] = InferenceClientModel(
+                    model_id=model_id,
+                    api_key=self.hf_key,
+                )
+            return self._models[model_id]
+
+    def _build_web_search(self, deadline: Deadline):
         @tool
         def web_search(query: str) -> str:
             """
@@ -52,11 +499,12 @@ class Coordinator:
             Args:
                 query: The search query to look up.
             """
+            if deadline.expired():
+                return "Search cancelled: the run deadline has been reached. Report what you have found so far."
             try:
-                response = self.tavily_client.search(query=query, search_depth="advanced", max_results=5)
-                results = response.get("results", [])
+                results, tier = self.search_policy.search(query, deadline)
                 formatted_results = []
-                logger.info(f"Tavily search results: {results}")
+                logger.debug(f"Tavily search results ({tier}): {results}")
                 for res in results:
                     formatted_results.append(f"Title: {res.get('title')}\nURL: {res.get('url')}\nContent: {res.get('content')}\n")
                 return "\n---\n".join(formatted_results) if formatted_results else "No relevant results found."
@@ -64,83 +512,103 @@ class Coordinator:
                 logger.error(f"Tavily search error: {e}")
                 return f"Search failed: {e}"
 
-        findings = []
-        
-        for task in subtasks:
-            subtask_id = task.get('id')
-            title = task.get('title')
-            description = task.get('description')
-            
-            logger.info(f"Starting sub-agent for task: {subtask_id}")
-
-            subagent = ToolCallingAgent(
-                tools=[web_search],
-                model=self.subagent_model,
-                add_base_tools=False,
-                name=f"subagent_{subtask_id}",
-                max_steps=1,
-            )
-            
-            subagent_prompt = SUBAGENT_DIRECTION.format(
-                user_query=user_query,
-                research_plan=research_plan,
-                subtask_id=subtask_id,
-                subtask_title=title,
-                subtask_description=description,
-            )
+        return web_search
+
+    def _stream_synthesis(
+        self,
+        messages: List[Dict],
+        max_tokens: int,
+        synthesis_input: str,
+        store: RunOutputStore,
+        on_token: Optional[Callable[[str], None]] = None,
+        deadline: Optional[Deadline] = None,
+        appendix: str = "",
+    ) -> str:
+        deadline = deadline or Deadline()
+        start_time = time.perf_counter()
+        self.metrics["time_to_first_report_byte"] = None
 
+        print("\n\033[93m--- Final Research Report ---\033[0m")
+        with store.open_stream("final_report.md") as f:
+            writer = ReportStreamWriter(f, echo=True, on_token=on_token)
             try:
-                finding = subagent.run(subagent_prompt)
-                findings.append(f"FINDINGS FOR TASK {subtask_id}: {title}\n\n{finding}")
-                
-                # Save individual sub-agent finding
-                os.makedirs("research_outputs", exist_ok=True)
-                with open(f"research_outputs/subtask_{subtask_id}.txt", "w", encoding="utf-8") as f:
-                    f.write(finding)
-                logger.info(f"Sub-agent for {subtask_id} complete. Finding saved to research_outputs/subtask_{subtask_id}.txt")
-                winsound.Beep(1000, 500)
-                
+                while True:
+                    model = self.health.select(self.model_name)
+                    if model is None:
+                        raise EndpointUnavailable(f"No healthy endpoint for {self.model_name} or its fallbacks")
+                    try:
+                        model_messages, model_max_tokens = self._refit("synthesis", model, messages, max_tokens)
+                        self._stream_from(model, model_messages, model_max_tokens, writer, deadline, start_time)
+                    except Exception as e:
+                        self.health.record_failure(model, e)
+                        # Nothing has reached the reader yet, so another endpoint can still produce the whole report
+                        if writer.parts or isinstance(e, DeadlineExceeded):
+                            raise
+                        logger.warning(f"Synthesis with {model} failed before any output ({e}); retrying")
+                        writer.reset()
+                        continue
+                    self.health.record_success(model)
+                    break
+                writer.feed(appendix)
+                final_report = writer.finish()
             except Exception as e:
-                logger.error(f"Error in sub-agent {subtask_id}: {e}")
-                findings.append(f"FINDINGS FOR TASK {subtask_id}: {title}\n\nERROR: Failed to complete task. {e}")
+                logger.error(f"Synthesis stream failed: {e}")
+                if not writer.parts:
+                    final_report = self._fallback_report(e, synthesis_input) + appendix
+                    f.write(final_report)
+                else:
+                    final_report = writer.abort(e)
+                    if appendix:
+                        writer.feed(appendix)
+                        final_report = writer.text.strip()
+        print("\033[93m-----------------------------\033[0m")
 
-        # Final Synthesis using the model directly
-        logger.info("Synthesizing final report...")
-        
-        system_prompt = COORDINATOR_DIRECTION.format(
-            user_query=user_query,
-            research_plan=research_plan,
-            subtasks_json=json.dumps(subtasks, indent=2)
-        )
-        
-        synthesis_input = "\n\n".join(findings)
-        user_prompt = f"Here are the findings from the specialized sub-agents. Please synthesize them into a cohesive final research report as per the original project guidelines.\n\nSUB-AGENT FINDINGS:\n{synthesis_input}"
-        
-        try:
-            response = self.coordinator_model(messages=[
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": user_prompt}
-            ])
-            
-            final_report = response.content
-            
-            # Clean up potential <think> tags if from a reasoning model
-            if "<think>" in final_report and "</think>" in final_report:
-                final_report = final_report.split("</think>")[-1].strip()
-            elif "<think>" in final_report:
-                final_report = final_report.split("<think>")[-1].strip()
-                if "\n\n" in final_report:
-                    final_report = final_report.split("\n\n", 1)[-1]
-            
-            # Save final report
-            with open("research_outputs/final_report.md", "w", encoding="utf-8") as f:
-                f.write(final_report)
-            logger.info("Final report saved to research_outputs/final_report.md")
-                    
-            return final_report
-        except Exception as e:
-            logger.error(f"Error during final synthesis: {e}")
-            return f"# Research Output\n\nFailed to synthesize final report. Error: {e}\n\n## Raw Findings\n\n{synthesis_input}"
+        self.metrics["synthesis_seconds"] = time.perf_counter() - start_time
+        logger.info(f"Final report saved to {store.path('final_report.md')}")
+        return final_report
+
+    def _refit(self, stage: str, model: str, messages: List[Dict], max_tokens: int) -> Tuple[List[Dict], int]:
+        # Prompts are sized for the primary model; a fallback with a smaller context window needs them refitted
+        if model == self.model_name:
+            return messages, max_tokens
+        return self.budget.fit(stage, model, messages, max_output_tokens=max_tokens)
+
+    def _stream_from(
+        self,
+        model: str,
+        messages: List[Dict],
+        max_tokens: int,
+        writer: ReportStreamWriter,
+        deadline: Deadline,
+        start_time: float,
+    ) -> None:
+        for delta in self._get_model(model).generate_stream(messages=messages, max_tokens=max_tokens):
+            # Cancelling the run stops research, not synthesis; only running out of time cuts the report short
+            remaining = deadline.remaining()
+            if remaining is not None and remaining <= 0:
+                raise DeadlineExceeded("run deadline reached")
+            if not delta.content:
+                continue
+            writer.feed(delta.content)
+            if writer.parts and self.metrics["time_to_first_report_byte"] is None:
+                ttfb = time.perf_counter() - start_time
+                self.metrics["time_to_first_report_byte"] = ttfb
+                logger.info(f"Time to first report byte: {ttfb:.2f}s")
+
+    @staticmethod
+    def _strip_thinking(final_report: str) -> str:
+        # Clean up potential <think> tags if from a reasoning model
+        if "<think>" in final_report and "</think>" in final_report:
+            final_report = final_report.split("</think>")[-1].strip()
+        elif "<think>" in final_report:
+            final_report = final_report.split("<think>")[-1].strip()
+            if "\n\n" in final_report:
+                final_report = final_report.split("\n\n", 1)[-1]
+        return final_report
+
+    @staticmethod
+    def _fallback_report(error: Exception, synthesis_input: str) -> str:
+        return f"# Research Output\n\nFailed to synthesize final report. Error: {error}\n\n## Raw Findings\n\n{synthesis_input}"
 
 if __name__ == "__main__":
     from dotenv import load_dotenv
@@ -0,0 +1,82 @@
+import re
+import time
+import logging
+import threading
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+DURATION_UNITS = {"ms": 0.001, "s": 1, "m": 60, "h": 3600}
+
+
+class DeadlineExceeded(TimeoutError):
+    pass
+
+
+def parse_duration(value: str) -> float:
+    # Accepts "300", "300s", "5m", "1h30m" or "1500ms"
+    text = str(value).strip().lower()
+    if re.fullmatch(r"\d+(\.\d+)?", text):
+        return float(text)
+    parts = re.findall(r"(\d+(?:\.\d+)?)\s*(ms|s|m|h)", text)
+    if not parts or "".join(n + u for n, u in parts) != re.sub(r"\s+", "", text):
+        raise ValueError(f"Invalid duration: {value!r} (expected e.g. 300s, 5m or 1h30m)")
+    return sum(float(number) * DURATION_UNITS[unit] for number, unit in parts)
+
+
+class Deadline:
+    """Run-level time budget shared by every stage; can also be cancelled explicitly."""
+
+    def __init__(self, seconds: Optional[float] = None, parent: Optional["Deadline"] = None):
+        self.seconds = seconds
+        self.expires_at = time.monotonic() + seconds if seconds is not None else None
+        self.parent = parent
+        self._cancelled = parent._cancelled if parent else threading.Event()
+        self._reason = None
+
+    @property
+    def reason(self) -> Optional[str]:
+        # Cancellation is shared with the parent, and so is its reason
+        return self._reason or (self.parent.reason if self.parent else None)
+
+    def remaining(self) -> Optional[float]:
+        remaining = None if self.expires_at is None else self.expires_at - time.monotonic()
+        if self.parent:
+            parent_remaining = self.parent.remaining()
+            if parent_remaining is not None:
+                remaining = parent_remaining if remaining is None else min(remaining, parent_remaining)
+        return remaining
+
+    def expired(self) -> bool:
+        if self._cancelled.is_set():
+            return True
+        remaining = self.remaining()
+        return remaining is not None and remaining <= 0
+
+    def cancel(self, reason: str = "cancelled") -> None:
+        if self.parent:
+            self.parent.cancel(reason)
+            return
+        if not self._cancelled.is_set():
+            logger.warning(f"Run cancelled: {reason}")
+        self._reason = reason
+        self._cancelled.set()
+
+    def check(self, stage: str) -> None:
+        if self.expired():
+            raise DeadlineExceeded(f"{stage}: {'run cancelled' if self._cancelled.is_set() else 'run deadline reached'}")
+
+    def timeout(self, default: Optional[float], minimum: float = 1.0) -> Optional[float]:
+        # Per-request timeout (or backoff) capped by the time left in the run
+        remaining = self.remaining()
+        if remaining is None:
+            return default
+        return max(remaining if default is None else min(default, remaining), minimum)
+
+    def reserve(self, seconds: float, max_share: float = 1.0) -> "Deadline":
+        # Child deadline that ends `seconds` earlier (but keeps back at most `max_share` of the time left),
+        # e.g. to keep time for synthesis after sub-agents without leaving them nothing on short runs
+        remaining = self.remaining()
+        if remaining is None:
+            return Deadline(None, parent=self)
+        return Deadline(max(remaining - min(seconds, remaining * max_share), 0), parent=self)
@@ -0,0 +1,194 @@
+import os
+import json
+import time
+import logging
+import threading
+from typing import Dict, List, Optional
+from .output_store import atomic_write
+from .deadline import DeadlineExceeded
+
+logger = logging.getLogger(__name__)
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+# Errors that mean the endpoint cannot serve this model at all, so retrying it is pointless.
+# An empty stream is not one of them: it is often transient and only counts towards the failure threshold.
+FATAL_STATUS_CODES = {401, 403, 404, 410}
+FATAL_MARKERS = (
+    "not supported on the current inference api endpoint", "model not found", "no longer available",
+    "is not a chat model",
+)
+
+
+class EndpointUnavailable(RuntimeError):
+    pass
+
+
+def status_code(error) -> Optional[int]:
+    # HTTP status of an HfHubHTTPError (or requests/httpx error), also when wrapped by smolagents
+    seen = set()
+    while error is not None and id(error) not in seen:
+        seen.add(id(error))
+        code = getattr(getattr(error, "response", None), "status_code", None)
+        if isinstance(code, int):
+            return code
+        error = error.__cause__ or error.__context__
+    return None
+
+
+def is_fatal(error) -> bool:
+    code = status_code(error) if isinstance(error, BaseException) else None
+    if code is not None and code in FATAL_STATUS_CODES:
+        return True
+    if code is not None and code >= 500:
+        return False
+    text = str(error).lower()
+    return any(marker in text for marker in FATAL_MARKERS)
+
+
+class CircuitBreaker:
+    """Closed -> open after repeated failures; after reset_timeout one half-open probe decides whether to close."""
+
+    def __init__(self, model: str, failure_threshold: int = 3, reset_timeout: float = 300):
+        self.model = model
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.probe_started = 0.0
+        self.last_error = None
+
+    def allow(self) -> bool:
+        if self.state == CLOSED:
+            return True
+        now = time.time()
+        started = self.opened_at if self.state == OPEN else self.probe_started
+        if now - started >= self.reset_timeout:
+            # Let exactly one call through as a probe (or a new one if the last probe never reported back)
+            self.state = HALF_OPEN
+            self.probe_started = now
+            logger.info(f"Circuit for {self.model} half-open; probing")
+            return True
+        return False
+
+    def record_success(self) -> None:
+        if self.state != CLOSED:
+            logger.info(f"Circuit for {self.model} closed; endpoint recovered")
+        self.state = CLOSED
+        self.failures = 0
+        self.last_error = None
+
+    def record_failure(self, error, fatal: bool = False) -> None:
+        self.failures += 1
+        self.last_error = str(error)[:300]
+        if self.state == HALF_OPEN or fatal or self.failures >= self.failure_threshold:
+            if self.state != OPEN:
+                logger.warning(f"Circuit for {self.model} opened after {self.failures} failure(s): {self.last_error}")
+            self.state = OPEN
+            self.opened_at = time.time()
+
+    def to_dict(self) -> Dict:
+        return {"state": self.state, "failures": self.failures, "opened_at": self.opened_at, "last_error": self.last_error}
+
+
+class EndpointHealth:
+    """Per-model circuit breakers shared by every stage, with fallback models and state persisted between runs."""
+
+    def __init__(
+        self,
+        fallbacks: Optional[Dict[str, List[str]]] = None,
+        failure_threshold: int = 3,
+        reset_timeout: float = 300,
+        probe_timeout: float = 30,
+        path: Optional[str] = "research_outputs/endpoint_health.json",
+    ):
+        self.fallbacks = fallbacks or {}
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.probe_timeout = probe_timeout
+        self.path = path
+        self._lock = threading.Lock()
+        self.breakers: Dict[str, CircuitBreaker] = {}
+        self._load()
+
+    def _breaker(self, model: str) -> CircuitBreaker:
+        if model not in self.breakers:
+            self.breakers[model] = CircuitBreaker(model, self.failure_threshold, self.reset_timeout)
+        return self.breakers[model]
+
+    def select(self, model: str) -> Optional[str]:
+        # First healthy model among the preferred one and its fallbacks; None when all circuits are open
+        with self._lock:
+            for candidate in [model] + [m for m in self.fallbacks.get(model, []) if m != model]:
+                if self._breaker(candidate).allow():
+                    if candidate != model:
+                        logger.warning(f"Circuit for {model} is open; failing over to {candidate}")
+                    return candidate
+        logger.error(f"No healthy endpoint for {model} or its fallbacks; failing fast")
+        return None
+
+    def timeout(self, model: str, default: Optional[float]) -> Optional[float]:
+        # Half-open probes get a short timeout so a still-dead endpoint costs seconds, not minutes
+        with self._lock:
+            probing = self._breaker(model).state == HALF_OPEN
+        if probing:
+            return self.probe_timeout if default is None else min(default, self.probe_timeout)
+        return default
+
+    def is_open(self, model: str) -> bool:
+        with self._lock:
+            return self._breaker(model).state != CLOSED
+
+    def backoff(self, model: str, seconds: float) -> float:
+        # No point waiting before a retry that will fail over to another model anyway
+        return 0.0 if self.is_open(model) else seconds
+
+    def record_success(self, model: str) -> None:
+        with self._lock:
+            changed = self._breaker(model).state != CLOSED
+            self._breaker(model).record_success()
+        if changed:
+            self._save()
+
+    def record_failure(self, model: str, error, fatal: Optional[bool] = None) -> None:
+        if isinstance(error, DeadlineExceeded):
+            # Running out of run time says nothing about the endpoint
+            return
+        with self._lock:
+            breaker = self._breaker(model)
+            was_open = breaker.state == OPEN
+            breaker.record_failure(error, is_fatal(error) if fatal is None else fatal)
+            changed = breaker.state == OPEN and not was_open
+        if changed:
+            self._save()
+
+    def _save(self) -> None:
+        if not self.path:
+            return
+        with self._lock:
+            snapshot = json.dumps({m: b.to_dict() for m, b in self.breakers.items() if b.state != CLOSED}, indent=2)
+        try:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            atomic_write(self.path, snapshot)
+        except OSError as e:
+            logger.error(f"Failed to save endpoint health {self.path}: {e}")
+
+    def _load(self) -> None:
+        # Open circuits survive restarts so the next run skips a dead endpoint until its probe is due
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                saved = json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Ignoring unreadable endpoint health {self.path}: {e}")
+            return
+        for model, state in saved.items():
+            breaker = self._breaker(model)
+            breaker.state = OPEN
+            breaker.failures = state.get("failures", 0)
+            breaker.opened_at = state.get("opened_at", 0.0)
+            breaker.last_error = state.get("last_error")
@@ -0,0 +1,142 @@
+import os
+import re
+import queue
+import shutil
+import logging
+import tempfile
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from typing import IO, Iterator, Optional
+
+logger = logging.getLogger(__name__)
+
+# Read once at import: os.umask can only be queried by setting it, which is not safe once writer threads run
+_UMASK = os.umask(0)
+os.umask(_UMASK)
+
+
+def atomic_write(path: str, content: str) -> None:
+    directory = os.path.dirname(path) or "."
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".tmp_", suffix=".part")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            f.write(content)
+            f.flush()
+            os.fsync(f.fileno())
+        # mkstemp creates the file 0600; give it the mode a plain open() would have
+        os.chmod(tmp_path, 0o666 & ~_UMASK)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+class RunOutputStore:
+    """Run-scoped output directory with atomic, background file writes."""
+
+    def __init__(self, root: str = "research_outputs", run_id: Optional[str] = None):
+        self.root = root
+        self.run_id = run_id or f"{time.strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:8]}"
+        self.run_dir = os.path.join(root, self.run_id)
+        os.makedirs(self.run_dir, exist_ok=run_id is not None)
+
+        self.errors = []
+        self._names = set()
+        self._names_lock = threading.Lock()
+        self._queue = queue.Queue()
+        self._closed = False
+        self._writer = threading.Thread(target=self._drain, name=f"output-writer-{self.run_id}", daemon=True)
+        self._writer.start()
+        logger.info(f"Writing run outputs to {self.run_dir}")
+
+    def path(self, name: str) -> str:
+        return os.path.join(self.run_dir, name)
+
+    def unique_name(self, name: str) -> str:
+        # Sanitize and de-duplicate so parallel writers with overlapping ids never share a file
+        name = re.sub(r"[^A-Za-z0-9._-]+", "_", name).strip("._") or "output"
+        stem, ext = os.path.splitext(name)
+        with self._names_lock:
+            candidate = name
+            counter = 2
+            while candidate in self._names:
+                candidate = f"{stem}_{counter}{ext}"
+                counter += 1
+            self._names.add(candidate)
+        return candidate
+
+    def write(self, name: str, content: str) -> str:
+        if self._closed:
+            raise RuntimeError(f"Output store for run {self.run_id} is closed.")
+        path = self.path(name)
+        self._queue.put((path, content))
+        return path
+
+    def write_now(self, name: str, content: str) -> str:
+        path = self.path(name)
+        atomic_write(path, content)
+        return path
+
+    @contextmanager
+    def open_stream(self, name: str) -> Iterator[IO[str]]:
+        # Stream into a sibling .partial file that is always readable, then publish it with an atomic rename
+        path = self.path(name)
+        partial_path = f"{path}.partial"
+        with open(partial_path, "w", encoding="utf-8") as f:
+            try:
+                yield f
+            finally:
+                f.flush()
+                os.fsync(f.fileno())
+        os.replace(partial_path, path)
+
+    def flush(self) -> None:
+        self._queue.join()
+
+    def close(self, archive: bool = False) -> Optional[str]:
+        if self._closed:
+            return None
+        self.flush()
+        self._closed = True
+        self._queue.put(None)
+        self._writer.join()
+        if self.errors:
+            logger.error(f"{len(self.errors)} output write(s) failed for run {self.run_id}")
+        if archive:
+            return self.archive()
+        return None
+
+    def archive(self) -> str:
+        archive_path = shutil.make_archive(
+            os.path.join(self.root, self.run_id),
+            "gztar",
+            root_dir=self.root,
+            base_dir=self.run_id,
+        )
+        logger.info(f"Archived run {self.run_id} to {archive_path}")
+        return archive_path
+
+    def _drain(self) -> None:
+        while True:
+            item = self._queue.get()
+            try:
+                if item is None:
+                    return
+                path, content = item
+                try:
+                    atomic_write(path, content)
+                    logger.debug(f"Saved {path}")
+                except Exception as e:
+                    logger.error(f"Failed to write {path}: {e}")
+                    self.errors.append((path, e))
+            finally:
+                self._queue.task_done()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
@@ -1,86 +1,174 @@
 import logging
 import time
+import threading
+from typing import Optional
 from huggingface_hub import InferenceClient
 from .prompts import PLANNER_DIRECTION
+from .topic_cache import TopicCache
+from .token_budget import TokenBudget, BudgetExceeded, estimate_tokens
+from .streaming import StreamAccumulator, continuation_messages
+from .deadline import Deadline
+from .endpoint_health import EndpointHealth
 
 logger = logging.getLogger(__name__)
 
 class Planner:
-    def __init__(self, model_name: str, hf_key: str):
+    def __init__(
+        self,
+        model_name: str,
+        hf_key: str,
+        cache: Optional[TopicCache] = None,
+        refresh_cache: bool = False,
+        budget: Optional[TokenBudget] = None,
+        continue_partial: bool = True,
+        health: Optional[EndpointHealth] = None,
+    ):
         self.model_name = model_name
-        self.client = InferenceClient(token=hf_key, timeout=120)
+        self.request_timeout = 120
+        self.client = InferenceClient(token=hf_key, timeout=self.request_timeout)
+        self.budget = budget or TokenBudget()
+        self.health = health or EndpointHealth()
+        self.continue_partial = continue_partial
+        self.cache = cache
+        self.refresh_cache = refresh_cache
 
-    def plan(self, topic: str) -> str:
+    def plan(self, topic: str, deadline: Optional[Deadline] = None) -> str:
+        research_plan = self.cache.lookup("plan", topic) if self.cache else None
+        if research_plan:
+            if self.refresh_cache:
+                threading.Thread(target=self._generate_plan, args=(topic,), daemon=True).start()
+        else:
+            research_plan = self._generate_plan(topic, deadline)
+            if not research_plan:
+                return ""
+
+        print("\n\033[93m--- Research Plan ---\033[0m")
+        print(research_plan)
+        print("\033[93m---------------------\033[0m")
+        return research_plan
+
+    def _generate_plan(self, topic: str, deadline: Optional[Deadline] = None) -> str:
+        deadline = deadline or Deadline()
         logger.info(f'Starting Planning: {topic} using model {self.model_name}')
+
+        base_messages = [
+            {"role": "system", "content": PLANNER_DIRECTION},
+            {"role": "user", "content": topic},
+        ]
+        try:
+            messages, max_tokens = self.budget.fit("planner", self.model_name, base_messages, max_output_tokens=4000)
+        except BudgetExceeded as e:
+            logger.error(f"Skipping planning: {e}")
+            return ""
         
+        fitted_model = self.model_name
         max_retries = 3
+        partial = ""
         for attempt in range(max_retries):
+            if deadline.expired():
+                logger.warning("Run deadline reached during planning")
+                break
+            # An open circuit skips the model (or fails over to its fallback) without waiting on timeouts
+            model = self.health.select(self.model_name)
+            if model is None:
+                break
+            if model != fitted_model:
+                # A fallback can have a smaller context window than the primary model
+                try:
+                    messages, max_tokens = self.budget.fit("planner", model, base_messages, max_output_tokens=4000)
+                except BudgetExceeded as e:
+                    logger.error(f"Cannot fail over to {model}: {e}")
+                    break
+                fitted_model = model
+            self.client.timeout = deadline.timeout(self.health.timeout(model, self.request_timeout))
             try:
-                full_content = ""
+                request_messages, request_max_tokens = messages, max_tokens
+                if partial:
+                    # Resume the interrupted generation so the retry only pays for the missing tail
+                    logger.info(f"Continuing partial plan ({len(partial)} chars) instead of regenerating")
+                    request_messages = continuation_messages(messages, partial)
+                    request_max_tokens = max(max_tokens - estimate_tokens(partial), 256)
+
+                accumulator = StreamAccumulator(prefix=partial)
+                stream_error = None
+                partial = ""
                 # Use streaming for robustness with reasoning/large models
                 try:
                     stream = self.client.chat_completion(
-                        model=self.model_name,
-                        messages=[
-                            {"role": "system", "content": PLANNER_DIRECTION},
-                            {"role": "user", "content": topic}
-                        ],
-                        max_tokens=4000,
+                        model=model,
+                        messages=request_messages,
+                        max_tokens=request_max_tokens,
                         stream=True,
                         temperature=1.0,
                         top_p=1.0
                     )
-                    
-                    for chunk in stream:
-                        delta = chunk.choices[0].delta
-                        if hasattr(delta, 'content') and delta.content:
-                            full_content += delta.content
-                        if hasattr(delta, 'reasoning_content') and delta.reasoning_content:
-                            if "<think>" not in full_content:
-                                full_content += "<think>"
-                            full_content += delta.reasoning_content
-                        elif hasattr(delta, 'reasoning') and delta.reasoning:
-                            if "<think>" not in full_content:
-                                full_content += "<think>"
-                            full_content += delta.reasoning
-                            
-                    if "<think>" in full_content and "</think>" not in full_content:
-                        full_content += "</think>"
+                    accumulator.consume(stream, deadline)
+                    if accumulator.restarted:
+                        # This endpoint does not honour assistant prefixes; later retries regenerate from scratch
+                        logger.warning(f"{model} restarted the plan instead of continuing it; disabling continuation")
+                        self.continue_partial = False
                             
                 except StopIteration:
-                    if not full_content:
-                         logger.error(f"Model {self.model_name} returned an empty stream. It may not be supported on the current Inference API endpoint.")
+                    if not accumulator.text:
+                         logger.error(f"Model {model} returned an empty stream. It may not be supported on the current Inference API endpoint.")
                     else:
                         logger.warning("Stream ended with StopIteration.")
                 except Exception as stream_err:
                     logger.error(f"Streaming failed: {stream_err}")
+                    self.health.record_failure(model, stream_err)
+                    stream_error = stream_err
+                    if deadline.expired():
+                        partial = accumulator.text
+                        break
+                    if self.continue_partial and accumulator.text and attempt < max_retries - 1:
+                        partial = accumulator.text
+                        time.sleep(deadline.timeout(self.health.backoff(model, 2 ** attempt), minimum=0))
+                        continue
 
+                full_content = accumulator.close()
                 if not full_content:
+                    if stream_error is None:
+                        self.health.record_failure(model, f"{model} returned an empty stream")
                     logger.warning(f"Empty content received on attempt {attempt + 1}")
                     continue
+                if stream_error is None:
+                    self.health.record_success(model)
 
-                # Remove DeepSeek/NVIDIA thinking block if present
-                research_plan = full_content.strip()
-                if "<think>" in research_plan and "</think>" in research_plan:
-                    logger.info("Detected thinking block in plan, extracting final content...")
-                    research_plan = research_plan.split("</think>")[-1].strip()
-                elif "<think>" in research_plan:
-                    # Handle unclosed think blocks
-                    research_plan = research_plan.split("<think>")[-1].strip()
-                    if "\n\n" in research_plan: # Guess where text might start if logic is cut
-                         research_plan = research_plan.split("\n\n", 1)[-1]
-
+                research_plan = self._extract_plan(full_content)
+                if stream_error is not None:
+                    # Same rule as the deadline path: a plan cut off by a stream error is used but never cached
+                    logger.warning("Using a partial research plan; the stream failed before it finished")
+                    return research_plan
                 logger.info("Generated research plan")
-                print("\n\033[93m--- Research Plan ---\033[0m")
-                print(research_plan)
-                print("\033[93m---------------------\033[0m")
+                if self.cache and research_plan:
+                    self.cache.store("plan", topic, research_plan)
                 return research_plan
             except Exception as e:
                 logger.error(f"Error during API call (Attempt {attempt + 1}/{max_retries}): {e}")
+                self.health.record_failure(model, e)
                 if attempt < max_retries - 1:
-                    wait_time = 2 ** attempt  
+                    wait_time = deadline.timeout(self.health.backoff(model, 2 ** attempt), minimum=0)
                     logger.info(f"Retrying in {wait_time} seconds...")
                     time.sleep(wait_time)
                 else:
                      return ""
+
+        # Out of time: a truncated plan is more useful than none, but it is not cached
+        if partial and deadline.expired():
+            logger.warning("Returning the partial plan generated before the deadline")
+            return self._extract_plan(StreamAccumulator(prefix=partial).close())
         return ""
+
+    @staticmethod
+    def _extract_plan(full_content: str) -> str:
+        # Remove DeepSeek/NVIDIA thinking block if present
+        research_plan = full_content.strip()
+        if "<think>" in research_plan and "</think>" in research_plan:
+            logger.info("Detected thinking block in plan, extracting final content...")
+            research_plan = research_plan.split("</think>")[-1].strip()
+        elif "<think>" in research_plan:
+            # Handle unclosed think blocks
+            research_plan = research_plan.split("<think>")[-1].strip()
+            if "\n\n" in research_plan: # Guess where text might start if logic is cut
+                 research_plan = research_plan.split("\n\n", 1)[-1]
+        return research_plan
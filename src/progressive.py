@@ -0,0 +1,86 @@
+import logging
+import threading
+from typing import Callable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class ProgressiveDraft:
+    """Folds findings into a running draft report on a background thread as they arrive."""
+
+    def __init__(
+        self,
+        fold: Callable[[str, List[str]], str],
+        on_update: Optional[Callable[[str], None]] = None,
+    ):
+        # fold(draft, new_findings) returns the updated draft; findings arriving mid-fold are batched into the next one
+        self.fold = fold
+        self.on_update = on_update
+        self.draft = ""
+        self.folds = 0
+        self._pending: List[str] = []
+        self._in_flight: List[str] = []
+        self._failed: List[str] = []
+        self._closed = False
+        self._abandoned = False
+        self._cond = threading.Condition()
+        self._thread = threading.Thread(target=self._run, name="progressive-draft", daemon=True)
+        self._thread.start()
+
+    def add(self, finding: str) -> None:
+        with self._cond:
+            self._pending.append(finding)
+            self._cond.notify()
+
+    def snapshot(self) -> str:
+        with self._cond:
+            return self.draft
+
+    def close(self, timeout: Optional[float] = None) -> Tuple[str, List[str]]:
+        # Wait (up to timeout) only for the fold already running; returns the draft and the findings it lacks
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+        self._thread.join(timeout)
+        with self._cond:
+            if self._thread.is_alive():
+                # The late fold's result is dropped; its findings go to the final pass instead
+                self._abandoned = True
+                logger.warning(f"Draft fold still running at close; {len(self._in_flight)} finding(s) left for the final pass")
+            unfolded = self._failed + self._in_flight + self._pending
+            self._pending = []
+            return self.draft, unfolded
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                while not self._pending and not self._closed:
+                    self._cond.wait()
+                if self._closed:
+                    # Findings still queued at close go straight to the final pass instead of another full fold
+                    return
+                batch, self._pending = self._pending, []
+                self._in_flight = batch
+                draft = self.draft
+
+            try:
+                updated = self.fold(draft, batch)
+            except Exception as e:
+                logger.error(f"Failed to fold {len(batch)} finding(s) into the draft: {e}")
+                updated = None
+
+            with self._cond:
+                if self._abandoned:
+                    return
+                self._in_flight = []
+                if updated:
+                    self.draft = updated
+                    self.folds += 1
+                    logger.info(f"Draft report updated with {len(batch)} finding(s) (fold {self.folds})")
+                else:
+                    self._failed.extend(batch)
+            if updated and self.on_update:
+                try:
+                    self.on_update(updated)
+                except Exception as e:
+                    logger.error(f"Draft update callback failed: {e}")
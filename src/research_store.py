@@ -0,0 +1,149 @@
+import os
+import re
+import json
+import time
+import sqlite3
+import logging
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional
+from .topic_cache import hashed_ngrams, idf_weights, tfidf_vector, cosine, terms_conflict
+
+logger = logging.getLogger(__name__)
+
+URL_PATTERN = re.compile(r"https?://[^\s)\]>\"'<]+")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    run_id TEXT PRIMARY KEY,
+    topic TEXT NOT NULL,
+    plan TEXT NOT NULL,
+    subtasks TEXT NOT NULL,
+    created_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS findings (
+    run_id TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    subtask_id TEXT,
+    title TEXT,
+    description TEXT,
+    finding TEXT NOT NULL,
+    sources TEXT NOT NULL,
+    researched_at REAL NOT NULL,
+    PRIMARY KEY (run_id, position)
+);
+"""
+
+
+def extract_sources(text: str) -> List[str]:
+    return list(dict.fromkeys(url.rstrip(".,;:") for url in URL_PATTERN.findall(text or "")))
+
+
+def _subtask_text(task: Dict) -> str:
+    return f"{task.get('title') or ''} {task.get('description') or ''}"
+
+
+class ResearchStore:
+    """Cross-run store of topics, plans and per-subtask findings used to refresh only stale research."""
+
+    def __init__(
+        self,
+        path: str = "research_outputs/research_store.db",
+        max_age: float = 7 * 24 * 3600,
+        topic_threshold: float = 0.75,
+        subtask_threshold: float = 0.8,
+    ):
+        self.path = path
+        self.max_age = max_age
+        self.topic_threshold = topic_threshold
+        self.subtask_threshold = subtask_threshold
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with self._connect() as conn:
+            conn.executescript(SCHEMA)
+
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        conn = sqlite3.connect(self.path, timeout=30)
+        conn.row_factory = sqlite3.Row
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def save_run(self, run_id: str, topic: str, plan: str, subtasks: List[Dict]) -> None:
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO runs (run_id, topic, plan, subtasks, created_at) VALUES (?, ?, ?, ?, ?)",
+                (run_id, topic, plan, json.dumps(subtasks), time.time()),
+            )
+
+    def save_finding(self, run_id: str, position: int, task: Dict, finding: str) -> None:
+        sources = extract_sources(finding)
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO findings "
+                "(run_id, position, subtask_id, title, description, finding, sources, researched_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (run_id, position, task.get('id'), task.get('title'), task.get('description'),
+                 finding, json.dumps(sources), time.time()),
+            )
+
+    def match(self, topic: str, subtasks: List[Dict], max_age: Optional[float] = None) -> Dict[int, Dict]:
+        # Map positions of new subtasks to fresh stored findings from runs on a similar topic
+        max_age = self.max_age if max_age is None else max_age
+        cutoff = time.time() - max_age
+        with self._connect() as conn:
+            runs = conn.execute("SELECT run_id, topic FROM runs").fetchall()
+            related = self._related_runs(topic, runs)
+            if not related:
+                return {}
+            placeholders = ",".join("?" * len(related))
+            rows = [dict(r) for r in conn.execute(
+                f"SELECT * FROM findings WHERE run_id IN ({placeholders}) AND researched_at >= ? "
+                "ORDER BY researched_at DESC",
+                (*related, cutoff),
+            ).fetchall()]
+        if not rows:
+            return {}
+
+        corpus = [hashed_ngrams(_subtask_text(r)) for r in rows]
+        idf, default_idf = idf_weights(corpus)
+        stored_vectors = [tfidf_vector(features, idf, default_idf) for features in corpus]
+
+        matches = {}
+        used = set()
+        for position, task in enumerate(subtasks):
+            query = tfidf_vector(hashed_ngrams(_subtask_text(task)), idf, default_idf)
+            best, best_score = None, 0.0
+            for i, vector in enumerate(stored_vectors):
+                # A finding about another region or year is never reused, however similar the wording
+                if i in used or terms_conflict(_subtask_text(task), _subtask_text(rows[i])):
+                    continue
+                score = cosine(query, vector)
+                if score > best_score:
+                    best, best_score = i, score
+            if best is not None and best_score >= self.subtask_threshold:
+                used.add(best)
+                row = rows[best]
+                row["sources"] = json.loads(row["sources"])
+                row["similarity"] = best_score
+                matches[position] = row
+                age_hours = (time.time() - row["researched_at"]) / 3600
+                logger.info(
+                    f"Reusing finding for subtask {task.get('id')} from run {row['run_id']} "
+                    f"(similarity {best_score:.2f}, {age_hours:.1f}h old)"
+                )
+        logger.info(f"{len(matches)}/{len(subtasks)} subtasks have fresh stored findings")
+        return matches
+
+    def _related_runs(self, topic: str, runs: List[sqlite3.Row]) -> List[str]:
+        features = [hashed_ngrams(r["topic"]) for r in runs]
+        query_features = hashed_ngrams(topic)
+        idf, default_idf = idf_weights(features + [query_features])
+        query = tfidf_vector(query_features, idf, default_idf)
+        return [
+            run["run_id"]
+            for run, run_features in zip(runs, features)
+            if cosine(query, tfidf_vector(run_features, idf, default_idf)) >= self.topic_threshold
+            and not terms_conflict(topic, run["topic"])
+        ]
@@ -0,0 +1,193 @@
+import os
+import time
+import sqlite3
+import logging
+import threading
+from contextlib import contextmanager
+from typing import Dict, Iterator, Optional
+
+logger = logging.getLogger(__name__)
+
+REASONING_MARKERS = (
+    "analy", "compar", "evaluat", "assess", "forecast", "predict", "trend", "impact", "implication",
+    "trade-off", "tradeoff", "synthes", "critiq", "explain", "why", "cause", "strateg", "scenario",
+)
+LOOKUP_MARKERS = (
+    "list", "find", "identify", "collect", "gather", "look up", "name", "define", "statistic", "figure", "date",
+)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS model_latency (
+    model TEXT PRIMARY KEY,
+    ewma_seconds REAL,
+    calls INTEGER NOT NULL,
+    failures INTEGER NOT NULL,
+    updated_at REAL
+);
+"""
+
+
+class LatencyStats:
+    """Exponentially weighted per-model latency and failure statistics, shared through SQLite across processes."""
+
+    def __init__(
+        self,
+        path: Optional[str] = "research_outputs/model_latency.db",
+        alpha: float = 0.3,
+        max_age: float = 24 * 3600,
+    ):
+        # Coordinator and workers pointing at the same path (e.g. the work queue database) share one estimate
+        self.path = path
+        self.alpha = alpha
+        # Latency older than this no longer describes the endpoint and is ignored
+        self.max_age = max_age
+        self._lock = threading.Lock()
+        self.models: Dict[str, Dict[str, float]] = {}
+        if path:
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            with self._connect() as conn:
+                conn.executescript(SCHEMA)
+
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    def expected(self, model: str, default: Optional[float] = None) -> Optional[float]:
+        stats = self._current(model)
+        if not stats or stats.get("ewma_seconds") is None or time.time() - stats["updated_at"] > self.max_age:
+            return default
+        return stats["ewma_seconds"]
+
+    def age(self, model: str) -> Optional[float]:
+        # Seconds since the last successful sample; None if the model has none
+        stats = self._current(model)
+        if not stats or stats.get("ewma_seconds") is None:
+            return None
+        return time.time() - (stats.get("updated_at") or 0.0)
+
+    def record(self, model: str, seconds: float, success: bool = True) -> None:
+        stats = None
+        if self.path:
+            try:
+                # Read-modify-write in one write transaction so concurrent workers never drop each other's samples
+                with self._connect() as conn:
+                    conn.execute("BEGIN IMMEDIATE")
+                    row = conn.execute("SELECT * FROM model_latency WHERE model = ?", (model,)).fetchone()
+                    stats = self._update(dict(row) if row else None, seconds, success)
+                    conn.execute(
+                        "INSERT OR REPLACE INTO model_latency (model, ewma_seconds, calls, failures, updated_at) "
+                        "VALUES (?, ?, ?, ?, ?)",
+                        (model, stats["ewma_seconds"], stats["calls"], stats["failures"], stats["updated_at"]),
+                    )
+                    conn.execute("COMMIT")
+            except sqlite3.Error as e:
+                logger.error(f"Failed to save latency stats {self.path}: {e}")
+                stats = None
+        with self._lock:
+            if stats is None:
+                stats = self._update(self.models.get(model), seconds, success)
+            self.models[model] = stats
+        if success:
+            logger.info(f"Model {model} took {seconds:.1f}s (EWMA {stats['ewma_seconds']:.1f}s over {stats['calls']} calls)")
+        else:
+            logger.info(f"Model {model} failed after {seconds:.1f}s ({stats['failures']}/{stats['calls']} calls failed)")
+
+    def _update(self, stats: Optional[Dict], seconds: float, success: bool) -> Dict:
+        stats = dict(stats or {"ewma_seconds": None, "calls": 0, "failures": 0, "updated_at": None})
+        stats["calls"] += 1
+        if success:
+            # Failed calls are often fast errors; averaging them in would make a broken model look fast
+            previous = stats.get("ewma_seconds")
+            stats["ewma_seconds"] = seconds if previous is None else self.alpha * seconds + (1 - self.alpha) * previous
+            stats["updated_at"] = time.time()
+        else:
+            stats["failures"] += 1
+        return stats
+
+    def _current(self, model: str) -> Optional[Dict]:
+        # Re-read the shared store so samples recorded by other processes are seen
+        if self.path:
+            try:
+                with self._connect() as conn:
+                    row = conn.execute("SELECT * FROM model_latency WHERE model = ?", (model,)).fetchone()
+                if row:
+                    with self._lock:
+                        self.models[model] = dict(row)
+            except sqlite3.Error as e:
+                logger.warning(f"Failed to read latency stats {self.path}: {e}")
+        with self._lock:
+            stats = self.models.get(model)
+            return dict(stats) if stats else None
+
+
+class ModelRouter:
+    """Sends each subtask to a fast small model or a large reasoning model within a latency/cost SLO."""
+
+    def __init__(
+        self,
+        fast_model: str,
+        large_model: str,
+        latency_slo: float = 180.0,
+        complexity_threshold: float = 0.5,
+        model_costs: Optional[Dict[str, float]] = None,
+        cost_slo: Optional[float] = None,
+        stats: Optional[LatencyStats] = None,
+        probe_interval: float = 1800,
+    ):
+        self.fast_model = fast_model
+        self.large_model = large_model
+        self.latency_slo = latency_slo
+        self.complexity_threshold = complexity_threshold
+        self.model_costs = model_costs or {}
+        self.cost_slo = cost_slo
+        self.stats = stats or LatencyStats()
+        # An over-SLO large model still gets one subtask per interval so its latency estimate can recover
+        self.probe_interval = probe_interval
+        self._probed_at: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def score(self, task: Dict) -> float:
+        text = f"{task.get('title') or ''} {task.get('description') or ''}".lower()
+        length = min(len(text) / 1200, 1.0)
+        reasoning = min(sum(marker in text for marker in REASONING_MARKERS) / 3, 1.0)
+        lookup = min(sum(marker in text for marker in LOOKUP_MARKERS) / 3, 1.0)
+        return max(0.0, min(1.0, 0.4 * length + 0.6 * reasoning - 0.2 * lookup))
+
+    def route(self, task: Dict) -> str:
+        complexity = self.score(task)
+        model = self.large_model if complexity >= self.complexity_threshold else self.fast_model
+        reason = f"complexity {complexity:.2f}"
+
+        if model == self.large_model:
+            expected = self.stats.expected(self.large_model)
+            cost = self.model_costs.get(self.large_model)
+            if expected is not None and expected > self.latency_slo:
+                reason = f"{reason}, {self.large_model} EWMA {expected:.0f}s exceeds {self.latency_slo:.0f}s SLO"
+                if self._probe_due(self.large_model):
+                    reason = f"{reason}; probing to refresh its latency"
+                else:
+                    model = self.fast_model
+            elif self.cost_slo is not None and cost is not None and cost > self.cost_slo:
+                model, reason = self.fast_model, f"{reason}, {self.large_model} cost {cost} exceeds {self.cost_slo} SLO"
+
+        logger.info(f"Routing subtask {task.get('id')} to {model} ({reason})")
+        return model
+
+    def record(self, model: str, seconds: float, success: bool = True) -> None:
+        self.stats.record(model, seconds, success)
+
+    def _probe_due(self, model: str) -> bool:
+        now = time.time()
+        with self._lock:
+            age = self.stats.age(model)
+            if age is not None and age < self.probe_interval:
+                return False
+            if now - self._probed_at.get(model, 0.0) < self.probe_interval:
+                return False
+            self._probed_at[model] = now
+            return True
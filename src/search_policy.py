@@ -0,0 +1,102 @@
+import logging
+import threading
+from collections import Counter
+from typing import Dict, List, Optional, Set, Tuple
+from .topic_cache import normalize_text, STOPWORDS
+from .deadline import Deadline
+
+logger = logging.getLogger(__name__)
+
+# Cheapest first; a query only moves to the next tier when the previous results fail the relevance check
+SEARCH_TIERS = [
+    {"name": "basic", "search_depth": "basic", "max_results": 5},
+    {"name": "advanced", "search_depth": "advanced", "max_results": 5},
+    {"name": "advanced-wide", "search_depth": "advanced", "max_results": 10},
+]
+STEM_LENGTH = 5
+
+
+def _stems(text: str) -> Set[str]:
+    # Crude prefix stemming so "emissions" matches "emission" and "forecasting" matches "forecast"
+    return {word[:STEM_LENGTH] for word in normalize_text(text).split() if word not in STOPWORDS and len(word) > 2}
+
+
+def score_results(query: str, results: List[Dict]) -> Tuple[float, List[float]]:
+    # Coverage of query keywords across all results, plus the share of keywords each result mentions
+    keywords = _stems(query)
+    if not keywords:
+        return 1.0, [1.0] * len(results)
+    covered = set()
+    per_result = []
+    for res in results:
+        found = keywords & _stems(f"{res.get('title') or ''} {res.get('content') or ''}")
+        covered |= found
+        per_result.append(len(found) / len(keywords))
+    return len(covered) / len(keywords), per_result
+
+
+class AdaptiveSearchPolicy:
+    """Runs each web search at the cheapest Tavily tier whose results pass a local relevance check."""
+
+    def __init__(
+        self,
+        client,
+        tiers: Optional[List[Dict]] = None,
+        min_coverage: float = 0.7,
+        min_relevant: int = 2,
+        relevance_threshold: float = 0.5,
+        request_timeout: float = 60,
+    ):
+        self.client = client
+        self.tiers = tiers or SEARCH_TIERS
+        self.min_coverage = min_coverage
+        self.min_relevant = min_relevant
+        self.relevance_threshold = relevance_threshold
+        self.request_timeout = request_timeout
+        self._lock = threading.Lock()
+        self.tier_counts = Counter()
+
+    def search(self, query: str, deadline: Optional[Deadline] = None) -> Tuple[List[Dict], str]:
+        deadline = deadline or Deadline()
+        best, best_quality, best_tier = None, None, None
+        for i, tier in enumerate(self.tiers):
+            if best is not None and deadline.expired():
+                break
+            try:
+                response = self.client.search(
+                    query=query,
+                    search_depth=tier["search_depth"],
+                    max_results=tier["max_results"],
+                    timeout=int(deadline.timeout(self.request_timeout)),
+                )
+            except Exception as e:
+                # A failed escalation still leaves the cheaper tier's results usable
+                if best is None:
+                    raise
+                logger.warning(f"Search tier {tier['name']} failed for {query!r}: {e}")
+                break
+
+            results = response.get("results", [])
+            coverage, per_result = score_results(query, results)
+            relevant = sum(score >= self.relevance_threshold for score in per_result)
+            passed = coverage >= self.min_coverage and relevant >= min(self.min_relevant, tier["max_results"])
+            outcome = "accepted" if passed else "escalating" if i + 1 < len(self.tiers) else "best effort"
+            logger.info(
+                f"Search tier {tier['name']} for {query!r}: {len(results)} results, "
+                f"coverage {coverage:.2f}, {relevant} relevant -> {outcome}"
+            )
+            quality = (coverage, relevant)
+            if best is None or quality > best_quality:
+                best, best_quality, best_tier = results, quality, tier["name"]
+            if passed:
+                break
+
+        with self._lock:
+            self.tier_counts[best_tier] += 1
+        return best, best_tier
+
+    def log_summary(self) -> None:
+        with self._lock:
+            counts = dict(self.tier_counts)
+        if counts:
+            logger.info("Search tiers used: " + ", ".join(f"{name} {count}" for name, count in counts.items()))
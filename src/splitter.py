@@ -1,16 +1,22 @@
 import os
-import json
 import logging
 import time
-from typing import List
-from pydantic import Field, BaseModel
+from typing import List, Optional
+from pydantic import Field, BaseModel, ConfigDict
 from huggingface_hub import InferenceClient
 from .prompts import SPLITTER_DIRECTION
+from .token_budget import TokenBudget, BudgetExceeded, estimate_tokens
+from .streaming import StreamAccumulator, continuation_messages
+from .structured import StructuredOutputParser
+from .deadline import Deadline
+from .endpoint_health import EndpointHealth
 from pprint import pprint
 
 logger = logging.getLogger(__name__)
 
 class Subtask(BaseModel):
+    model_config = ConfigDict(coerce_numbers_to_str=True)
+
     id: str = Field(
         ...,
         description="Short identifier for the subtask (e.g. 'A', 'history', 'drivers').",
@@ -37,68 +43,118 @@ TASK_SPLITTER_SCHEMA = {
 }
 
 class Splitter:
-    def __init__(self, model_name: str = "moonshotai/Kimi-K2-Thinking", hf_key: str = None):
+    def __init__(
+        self,
+        model_name: str = "moonshotai/Kimi-K2-Thinking",
+        hf_key: str = None,
+        budget: Optional[TokenBudget] = None,
+        continue_partial: bool = True,
+        health: Optional[EndpointHealth] = None,
+    ):
         self.model_name = model_name
+        self.budget = budget or TokenBudget()
+        self.health = health or EndpointHealth()
+        self.continue_partial = continue_partial
+        self.parser = StructuredOutputParser(Subtask, "subtasks")
         self.hf_key = hf_key or os.getenv("HF_KEY") or os.getenv("HF_TOKEN")
+        self.request_timeout = None
         self.client = InferenceClient(
             api_key=self.hf_key,
         )
 
-    def split(self, research_plan: str) -> List[dict]:
+    def split(self, research_plan: str, deadline: Optional[Deadline] = None) -> List[dict]:
+        deadline = deadline or Deadline()
         logger.info(f"Splitting the research plan into subtasks using {self.model_name}...")
+
+        base_messages = [
+            {"role": "system", "content": SPLITTER_DIRECTION},
+            {"role": "user", "content": research_plan},
+        ]
+        try:
+            messages, max_tokens = self.budget.fit("splitter", self.model_name, base_messages, max_output_tokens=4000)
+        except BudgetExceeded as e:
+            logger.error(f"Skipping split: {e}")
+            return []
         
+        fitted_model = self.model_name
         max_retries = 3
+        partial = ""
         for attempt in range(max_retries):
+            if deadline.expired():
+                logger.warning("Run deadline reached during splitting")
+                break
+            # An open circuit skips the model (or fails over to its fallback) without waiting on timeouts
+            model = self.health.select(self.model_name)
+            if model is None:
+                break
+            if model != fitted_model:
+                # A fallback can have a smaller context window than the primary model
+                try:
+                    messages, max_tokens = self.budget.fit("splitter", model, base_messages, max_output_tokens=4000)
+                except BudgetExceeded as e:
+                    logger.error(f"Cannot fail over to {model}: {e}")
+                    break
+                fitted_model = model
+            self.client.timeout = deadline.timeout(self.health.timeout(model, self.request_timeout))
             try:
-                full_content = ""
+                request_messages, request_max_tokens = messages, max_tokens
+                if partial:
+                    # Resume the interrupted generation so the retry only pays for the missing tail
+                    logger.info(f"Continuing partial subtask list ({len(partial)} chars) instead of regenerating")
+                    request_messages = continuation_messages(messages, partial)
+                    request_max_tokens = max(max_tokens - estimate_tokens(partial), 256)
+
+                accumulator = StreamAccumulator(prefix=partial)
+                stream_error = None
+                partial = ""
                 try:
-                    # Using chat_completion with streaming
+                    # Using chat_completion with streaming; schema-constrained decoding cannot resume a prefix
                     stream = self.client.chat_completion(
-                        model=self.model_name,
-                        messages=[
-                            {"role": "system", "content": SPLITTER_DIRECTION},
-                            {"role": "user", "content": research_plan},
-                        ],
+                        model=model,
+                        messages=request_messages,
                         response_format={
                             "type": "json_schema",
                             "json_schema": TASK_SPLITTER_SCHEMA,
                         } if attempt == 0 else None,
-                        max_tokens=4000,
+                        max_tokens=request_max_tokens,
                         stream=True,
                         temperature=0.6,
                         top_p=0.95
                     )
-
-                    for chunk in stream:
-                        delta = chunk.choices[0].delta
-                        if hasattr(delta, 'content') and delta.content:
-                            full_content += delta.content
-                        if hasattr(delta, 'reasoning_content') and delta.reasoning_content:
-                            if "<think>" not in full_content:
-                                full_content += "<think>"
-                            full_content += delta.reasoning_content
-                        elif hasattr(delta, 'reasoning') and delta.reasoning:
-                            if "<think>" not in full_content:
-                                full_content += "<think>"
-                            full_content += delta.reasoning
-                            
-                    if "<think>" in full_content and "</think>" not in full_content:
-                        full_content += "</think>"
+                    accumulator.consume(stream, deadline)
+                    if accumulator.restarted:
+                        # This endpoint does not honour assistant prefixes; later retries regenerate from scratch
+                        logger.warning(f"{model} restarted the subtask list instead of continuing it; disabling continuation")
+                        self.continue_partial = False
                 
                 except StopIteration:
-                    if not full_content:
-                        logger.error(f"Model {self.model_name} returned an empty stream. It may not be supported on the current Inference API endpoint.")
+                    if not accumulator.text:
+                        logger.error(f"Model {model} returned an empty stream. It may not be supported on the current Inference API endpoint.")
                     else:
                         logger.warning("Stream ended with StopIteration.")
                 except Exception as stream_err:
                     logger.error(f"Stream error: {stream_err}")
+                    self.health.record_failure(model, stream_err)
+                    stream_error = stream_err
+                    if deadline.expired():
+                        partial = accumulator.text
+                        break
+                    if self.continue_partial and accumulator.text and attempt < max_retries - 1:
+                        partial = accumulator.text
+                        time.sleep(deadline.timeout(self.health.backoff(model, 2 ** attempt), minimum=0))
+                        continue
 
+                full_content = accumulator.close()
                 if not full_content:
+                    if stream_error is None:
+                        self.health.record_failure(model, f"{model} returned an empty stream")
                     logger.warning(f"Empty content on attempt {attempt + 1}")
                     if attempt < max_retries - 1:
-                        time.sleep(2 ** attempt)
+                        time.sleep(deadline.timeout(self.health.backoff(model, 2 ** attempt), minimum=0))
                         continue
                     return []
+                if stream_error is None:
+                    self.health.record_success(model)
 
                 subtasks = self._parse_subtasks(full_content)
                 if subtasks:
@@ -106,61 +162,29 @@ class Splitter:
 
             except Exception as e:
                 logger.error(f"Error during split (Attempt {attempt + 1}): {e}")
+                self.health.record_failure(model, e)
                 if attempt < max_retries - 1:
-                    time.sleep(2 ** attempt)
-        
+                    time.sleep(deadline.timeout(self.health.backoff(model, 2 ** attempt), minimum=0))
+
+        # Out of time: keep whichever complete subtasks the partial output already contains
+        if partial and deadline.expired():
+            logger.warning("Salvaging subtasks from the partial output generated before the deadline")
+            return self._parse_subtasks(StreamAccumulator(prefix=partial).close())
         return []
 
     def _parse_subtasks(self, content: str) -> List[dict]:
         if not content:
             return []
-            
-        # Basic cleaning of the response
-        clean_content = content.strip()
-        
-        # Remove DeepSeek/NVIDIA thinking block if present
-        if "<think>" in clean_content:
-            if "</think>" in clean_content:
-                clean_content = clean_content.split("</think>")[-1].strip()
-            else:
-                parts = clean_content.split("<think>")
-                clean_content = parts[-1].strip()
-                if "{" in clean_content:
-                    clean_content = "{" + clean_content.split("{", 1)[1]
-
-        if "```json" in clean_content:
-            clean_content = clean_content.split("```json")[1].split("```")[0].strip()
-        elif "```" in clean_content:
-            block_content = clean_content.split("```")[1].split("```")[0].strip()
-            if block_content.startswith("{") or "[" in block_content:
-                clean_content = block_content
-
-        if not (clean_content.startswith("{") or clean_content.startswith("[")):
-            if "{" in clean_content:
-                clean_content = "{" + clean_content.split("{", 1)[1]
-            if "}" in clean_content:
-                clean_content = clean_content.rsplit("}", 1)[0] + "}"
 
-        try:
-            content_json = json.loads(clean_content)
-            if isinstance(content_json, dict):
-                subtasks = content_json.get('subtasks', [])
-            elif isinstance(content_json, list):
-                subtasks = content_json
-            else:
-                subtasks = []
-            
-            if subtasks:
-                print("\n\033[93m--- Generated Subtasks ---\033[0m")
-                for task in subtasks:
-                    print(f"\033[93mID: {task.get('id')} - {task.get('title')}\033[0m")
-                    pprint(task.get('description'))
-                    print()
-                return subtasks
-        except json.JSONDecodeError as je:
-            logger.error(f"Failed to parse JSON content: {je}. Snippet: {clean_content[:150]}...")
-            
-        return []
+        # Repairs and salvages locally; each item is validated against the Subtask schema
+        subtasks = self.parser.parse(content).items
+        if subtasks:
+            print("\n\033[93m--- Generated Subtasks ---\033[0m")
+            for task in subtasks:
+                print(f"\033[93mID: {task.get('id')} - {task.get('title')}\033[0m")
+                pprint(task.get('description'))
+                print()
+        return subtasks
 
 if __name__ == "__main__":
     # Test block
@@ -0,0 +1,215 @@
+import re
+import logging
+from typing import Callable, Dict, IO, List, Optional, TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from .deadline import Deadline
+
+logger = logging.getLogger(__name__)
+
+THINK_OPEN = "<think>"
+THINK_CLOSE = "</think>"
+
+
+class ThinkStripper:
+    """Removes <think>...</think> blocks from a token stream as chunks arrive."""
+
+    def __init__(self):
+        self._pending = ""
+        self._in_think = False
+        self._think_content = ""
+        self._saw_think = False
+        self._emitted_any = False
+
+    def feed(self, text: str) -> str:
+        if not text:
+            return ""
+        self._pending += text
+        output = ""
+        while self._pending:
+            tag = THINK_CLOSE if self._in_think else THINK_OPEN
+            idx = self._pending.find(tag)
+            if idx != -1:
+                if self._in_think:
+                    self._think_content += self._pending[:idx]
+                    self._in_think = False
+                else:
+                    output += self._pending[:idx]
+                    self._in_think = True
+                    self._saw_think = True
+                self._pending = self._pending[idx + len(tag):]
+                continue
+
+            # Hold back a tail that could be the start of a tag split across chunks
+            keep = self._partial_tag_length(self._pending, tag)
+            ready = self._pending[:len(self._pending) - keep]
+            self._pending = self._pending[len(self._pending) - keep:]
+            if self._in_think:
+                self._think_content += ready
+            else:
+                output += ready
+            break
+
+        # Reasoning models often emit the answer after a blank line following </think>
+        if output and not self._emitted_any:
+            output = output.lstrip()
+        if output:
+            self._emitted_any = True
+        return output
+
+    def flush(self) -> str:
+        remainder = self._pending
+        self._pending = ""
+        if self._in_think:
+            self._think_content += remainder
+            # Unclosed think block: mirror the non-streaming heuristic and guess where the answer starts
+            if self._emitted_any:
+                return ""
+            text = self._think_content.strip()
+            if "\n\n" in text:
+                return text.split("\n\n", 1)[-1]
+            return text
+        return remainder if self._emitted_any else remainder.lstrip()
+
+    @staticmethod
+    def _partial_tag_length(text: str, tag: str) -> int:
+        for size in range(min(len(tag) - 1, len(text)), 0, -1):
+            if tag.startswith(text[-size:]):
+                return size
+        return 0
+
+
+class ReportStreamWriter:
+    """Writes streamed report text to a file and the console, keeping the file valid at every step."""
+
+    def __init__(
+        self,
+        file: IO[str],
+        echo: bool = True,
+        on_token: Optional[Callable[[str], None]] = None,
+    ):
+        self.file = file
+        self.echo = echo
+        self.on_token = on_token
+        self.stripper = ThinkStripper()
+        self.parts = []
+
+    @property
+    def text(self) -> str:
+        return "".join(self.parts)
+
+    def feed(self, chunk: str) -> None:
+        self._emit(self.stripper.feed(chunk))
+
+    def finish(self) -> str:
+        self._emit(self.stripper.flush())
+        if self.echo:
+            print()
+        return self.text.strip()
+
+    def reset(self) -> None:
+        # Drop think/partial-tag state left by an attempt that emitted nothing, before retrying elsewhere
+        if not self.parts:
+            self.stripper = ThinkStripper()
+
+    def abort(self, error: Exception) -> str:
+        self._emit(self.stripper.flush())
+        notice = f"\n\n---\n\n> **Report truncated:** the synthesis stream was interrupted ({error}).\n"
+        self._emit(notice)
+        if self.echo:
+            print()
+        return self.text.strip()
+
+    def _emit(self, text: str) -> None:
+        if not text:
+            return
+        self.parts.append(text)
+        self.file.write(text)
+        self.file.flush()
+        if self.echo:
+            print(text, end="", flush=True)
+        if self.on_token:
+            try:
+                self.on_token(text)
+            except Exception as e:
+                logger.warning(f"Report token callback failed: {e}")
+
+
+class StreamAccumulator:
+    """Collects content and reasoning deltas from a chat completion stream, keeping whatever arrived if it breaks."""
+
+    def __init__(self, prefix: str = ""):
+        self.prefix = prefix
+        self.content = ""
+
+    @property
+    def text(self) -> str:
+        return stitch(self.prefix, self.content) if self.prefix else self.content
+
+    @property
+    def restarted(self) -> bool:
+        # True when the endpoint ignored the assistant prefix and generated a whole new answer
+        return bool(self.prefix) and is_restart(self.prefix, self.content)
+
+    def consume(self, stream, deadline: Optional["Deadline"] = None) -> None:
+        for chunk in stream:
+            self.add(chunk.choices[0].delta)
+            if deadline is not None:
+                deadline.check("stream")
+
+    def add(self, delta) -> None:
+        if hasattr(delta, 'content') and delta.content:
+            self.content += delta.content
+        # Capture DeepSeek-R1 style reasoning and wrap it in think tags to satisfy our parsers
+        reasoning = getattr(delta, 'reasoning_content', None) or getattr(delta, 'reasoning', None)
+        if reasoning:
+            if "<think>" not in self.prefix + self.content:
+                self.content += "<think>"
+            self.content += reasoning
+
+    def close(self) -> str:
+        # Close think tag if it was opened but never closed by the model
+        text = self.text
+        if "<think>" in text and "</think>" not in text:
+            text += "</think>"
+        return text
+
+
+def continuation_messages(messages: List[Dict[str, str]], partial: str) -> List[Dict[str, str]]:
+    # Assistant-prefix continuation: the model resumes its own unfinished message instead of starting over
+    return messages + [{"role": "assistant", "content": partial}]
+
+
+def _squash(text: str) -> str:
+    # Whitespace and case differ freely between samples (pretty-printed JSON, heading spacing)
+    return re.sub(r"\s+", "", text).lower()
+
+
+def _answer(text: str) -> str:
+    return text.split(THINK_CLOSE, 1)[1] if THINK_CLOSE in text else text
+
+
+def is_restart(partial: str, continuation: str, head_size: int = 30) -> bool:
+    # A continuation never reopens reasoning; otherwise the fresh output has started over when the opening
+    # of the partial answer reappears near its start. Matching only the first character is not enough:
+    # a stream cut between array items or before a heading resumes with "{" or "# " too.
+    if not partial.strip() or not continuation.strip():
+        return False
+    if continuation.lstrip().startswith(THINK_OPEN):
+        return True
+    head = _squash(_answer(partial))[:head_size]
+    fresh = _squash(_answer(continuation))
+    return bool(head) and head in fresh[:len(head) + 200]
+
+
+def stitch(partial: str, continuation: str, min_overlap: int = 20, max_overlap: int = 200) -> str:
+    if not continuation:
+        return partial
+    # Endpoints that ignore the assistant prefix restart from scratch; keep the fresh output in that case
+    if is_restart(partial, continuation):
+        return continuation
+    # Drop any text the model repeated from the end of the partial output
+    for size in range(min(max_overlap, len(partial), len(continuation)), min_overlap - 1, -1):
+        if partial.endswith(continuation[:size]):
+            return partial + continuation[size:]
+    return partial + continuation
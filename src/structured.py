@@ -0,0 +1,234 @@
+import re
+import json
+import logging
+import threading
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple, Type
+from pydantic import BaseModel, ValidationError
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class ParseResult:
+    items: List[Dict[str, Any]] = field(default_factory=list)
+    candidates: int = 0
+    repaired: bool = False
+
+    @property
+    def dropped(self) -> int:
+        return self.candidates - len(self.items)
+
+    @property
+    def salvage_rate(self) -> float:
+        return len(self.items) / self.candidates if self.candidates else 0.0
+
+
+def strip_reasoning(content: str) -> str:
+    clean_content = content.strip()
+    # Remove DeepSeek/NVIDIA thinking block if present
+    if "<think>" in clean_content:
+        if "</think>" in clean_content:
+            clean_content = clean_content.split("</think>")[-1].strip()
+        else:
+            # If think is open but not closed, the JSON (if any) comes after the reasoning
+            clean_content = clean_content.split("<think>")[-1].strip()
+    return clean_content
+
+
+def json_candidates(text: str) -> List[str]:
+    # Code-fenced blocks first (possibly unterminated), then everything from the first brace or bracket
+    candidates = []
+    for match in re.finditer(r"```(?:json)?\s*(.*?)(?:```|$)", text, re.DOTALL):
+        block = match.group(1).strip()
+        if block.startswith(("{", "[")):
+            candidates.append(block)
+    for opener in ("{", "["):
+        idx = text.find(opener)
+        if idx != -1:
+            candidates.append(text[idx:].strip())
+    return candidates
+
+
+def repair_json(text: str) -> str:
+    return _repair(text)[0]
+
+
+def _repair(text: str) -> Tuple[str, bool]:
+    # Drop stray closers and trailing commas, close unterminated strings, arrays and objects.
+    # The flag reports whether closers had to be synthesized, i.e. the text was truncated.
+    out = []
+    stack = []
+    in_string = False
+    escape = False
+    end = len(text)
+    for i, ch in enumerate(text):
+        if in_string:
+            out.append(ch)
+            if escape:
+                escape = False
+            elif ch == "\\":
+                escape = True
+            elif ch == '"':
+                in_string = False
+            continue
+        if ch == '"':
+            in_string = True
+        elif ch in "{[":
+            stack.append("}" if ch == "{" else "]")
+        elif ch in "}]":
+            if not stack or stack[-1] != ch:
+                continue
+            _strip_trailing_comma(out)
+            stack.pop()
+            if not stack:
+                out.append(ch)
+                end = i
+                break
+        out.append(ch)
+
+    repaired = "".join(out)
+    if end < len(text) - 1:
+        # Anything after the top-level value closed is stray prose
+        return repaired, False
+    truncated = in_string or bool(stack)
+    if in_string:
+        if escape:
+            repaired = repaired[:-1]
+        repaired += '"'
+    while stack:
+        repaired = repaired.rstrip()
+        if stack[-1] == "}":
+            # A key without a value (or a dangling colon) cannot be kept
+            repaired = re.sub(r'([{,])\s*"(?:[^"\\]|\\.)*"\s*:?\s*$', r"\1", repaired)
+        repaired = repaired.rstrip().rstrip(",")
+        repaired += stack.pop()
+    return repaired, truncated
+
+
+def _strip_trailing_comma(out: List[str]) -> None:
+    while out and out[-1].isspace():
+        out.pop()
+    if out and out[-1] == ",":
+        out.pop()
+
+
+def salvage_array_items(text: str, list_key: Optional[str] = None) -> Tuple[List[Any], int]:
+    # Decode complete items one by one so a truncated or malformed tail does not lose the whole array;
+    # returns the items and how many were dropped because they were cut off
+    start = -1
+    if list_key:
+        match = re.search(rf'"{re.escape(list_key)}"\s*:\s*\[', text)
+        if match:
+            start = match.end()
+    if start == -1:
+        idx = text.find("[")
+        if idx == -1:
+            return [], 0
+        start = idx + 1
+
+    decoder = json.JSONDecoder()
+    items = []
+    dropped = 0
+    pos = start
+    while pos < len(text):
+        while pos < len(text) and text[pos] in " \t\r\n,":
+            pos += 1
+        if pos >= len(text) or text[pos] == "]":
+            break
+        try:
+            item, pos = decoder.raw_decode(text, pos)
+            items.append(item)
+        except json.JSONDecodeError:
+            repaired, truncated = _repair(text[pos:])
+            if truncated:
+                # Only complete items are kept: closing a cut-off item would invent a shortened field
+                dropped += 1
+            else:
+                try:
+                    items.append(json.loads(repaired))
+                except json.JSONDecodeError:
+                    dropped += 1
+            break
+    return items, dropped
+
+
+class StructuredOutputParser:
+    """Parses model output into validated items, repairing malformed JSON locally before asking for a retry."""
+
+    def __init__(self, schema: Type[BaseModel], list_key: str):
+        self.schema = schema
+        self.list_key = list_key
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.repaired_calls = 0
+        self.items_kept = 0
+        self.items_seen = 0
+
+    @property
+    def salvage_rate(self) -> float:
+        return self.items_kept / self.items_seen if self.items_seen else 0.0
+
+    def parse(self, content: str) -> ParseResult:
+        result = ParseResult()
+        if content:
+            text = strip_reasoning(content)
+            for candidate in json_candidates(text):
+                result = self._parse_candidate(candidate)
+                if result.items:
+                    break
+
+        with self._lock:
+            self.calls += 1
+            self.repaired_calls += int(result.repaired)
+            self.items_kept += len(result.items)
+            self.items_seen += result.candidates
+        if result.candidates:
+            logger.info(
+                f"Parsed {len(result.items)}/{result.candidates} {self.list_key} "
+                f"(salvage rate {result.salvage_rate:.0%}{', repaired locally' if result.repaired else ''})"
+            )
+        else:
+            logger.error(f"No parsable {self.list_key} found. Snippet: {content[:150] if content else ''}...")
+        return result
+
+    def _parse_candidate(self, candidate: str) -> ParseResult:
+        raw_items = None
+        repaired = False
+        truncated_items = 0
+        try:
+            raw_items = self._extract_list(json.loads(candidate))
+        except json.JSONDecodeError:
+            repaired = True
+            fixed, truncated = _repair(candidate)
+            # A truncated document goes through item salvage so its cut-off last item is dropped, not closed
+            if not truncated:
+                try:
+                    raw_items = self._extract_list(json.loads(fixed))
+                except json.JSONDecodeError:
+                    pass
+        if not raw_items:
+            salvaged, truncated_items = salvage_array_items(candidate, self.list_key)
+            if salvaged or truncated_items:
+                raw_items = salvaged
+                repaired = True
+
+        items = []
+        for raw in raw_items or []:
+            try:
+                items.append(self.schema.model_validate(raw).model_dump())
+            except ValidationError as e:
+                logger.debug(f"Dropping invalid {self.list_key} item {raw!r}: {e}")
+        return ParseResult(items=items, candidates=len(raw_items or []) + truncated_items, repaired=repaired)
+
+    def _extract_list(self, data: Any) -> List[Any]:
+        # Handle potential nested list key or direct list
+        if isinstance(data, dict):
+            value = data.get(self.list_key)
+            if isinstance(value, list):
+                return value
+            # A single bare item is still usable
+            return [data] if self.list_key not in data else []
+        if isinstance(data, list):
+            return data
+        return []
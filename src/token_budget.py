@@ -0,0 +1,151 @@
+import re
+import math
+import logging
+import threading
+from typing import Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Context windows served by the Hugging Face Inference API for the models this project uses
+CONTEXT_WINDOWS = {
+    "deepseek-ai/DeepSeek-R1-Distill-Llama-8B": 32768,
+    "Qwen/Qwen2.5-Coder-32B-Instruct": 32768,
+    "meta-llama/Llama-3.3-70B-Instruct": 131072,
+    "MiniMaxAI/MiniMax-M1-80k": 131072,
+    "moonshotai/Kimi-K2-Thinking": 262144,
+}
+DEFAULT_CONTEXT_WINDOW = 32768
+MESSAGE_OVERHEAD_TOKENS = 4
+TRIM_MARKER = "\n\n[... {count} tokens trimmed to fit the context window ...]\n\n"
+
+
+class BudgetExceeded(ValueError):
+    pass
+
+
+def estimate_tokens(text: str) -> int:
+    # Local BPE-like estimate: every word or symbol is at least one token, long words split every ~4 chars
+    if not text:
+        return 0
+    return sum(max(1, math.ceil(len(piece) / 4)) for piece in re.findall(r"\w+|[^\w\s]", text))
+
+
+def estimate_messages_tokens(messages: List[Dict[str, str]]) -> int:
+    return sum(estimate_tokens(m.get("content") or "") + MESSAGE_OVERHEAD_TOKENS for m in messages)
+
+
+def compact_text(text: str, max_tokens: int) -> str:
+    # Keep the head and tail of the text, which usually carry the framing and the conclusions
+    total = estimate_tokens(text)
+    if total <= max_tokens:
+        return text
+    if max_tokens <= 0:
+        return ""
+    ratio = max_tokens / total
+    keep_chars = max(int(len(text) * ratio) - len(TRIM_MARKER) - 8, 0)
+    head = text[:keep_chars * 2 // 3]
+    tail = text[len(text) - keep_chars // 3:] if keep_chars // 3 else ""
+    return head + TRIM_MARKER.format(count=total - max_tokens) + tail
+
+
+def compact_sections(sections: List[str], max_tokens: int) -> List[str]:
+    # Share the budget evenly so no single section (e.g. a sub-agent finding) is dropped entirely
+    sizes = [estimate_tokens(s) for s in sections]
+    if sum(sizes) <= max_tokens:
+        return sections
+    remaining_budget = max_tokens
+    remaining_sections = len(sections)
+    allowances = {}
+    for i in sorted(range(len(sections)), key=lambda i: sizes[i]):
+        share = remaining_budget // remaining_sections
+        allowances[i] = min(sizes[i], share)
+        remaining_budget -= allowances[i]
+        remaining_sections -= 1
+    return [compact_text(s, allowances[i]) for i, s in enumerate(sections)]
+
+
+class TokenBudget:
+    """Estimates prompt sizes before each call, trims inputs to fit and records usage per stage."""
+
+    def __init__(self, context_windows: Optional[Dict[str, int]] = None, safety_margin: float = 0.05):
+        self.context_windows = dict(CONTEXT_WINDOWS)
+        self.context_windows.update(context_windows or {})
+        self.safety_margin = safety_margin
+        self.usage: Dict[str, List[Dict]] = {}
+        self._lock = threading.Lock()
+
+    def context_window(self, model: str) -> int:
+        return self.context_windows.get(model, DEFAULT_CONTEXT_WINDOW)
+
+    def usable_tokens(self, model: str) -> int:
+        return int(self.context_window(model) * (1 - self.safety_margin))
+
+    def available_input_tokens(self, model: str, messages: List[Dict[str, str]], output_tokens: int) -> int:
+        return self.usable_tokens(model) - output_tokens - estimate_messages_tokens(messages)
+
+    def fit(
+        self,
+        stage: str,
+        model: str,
+        messages: List[Dict[str, str]],
+        max_output_tokens: int,
+        min_output_tokens: int = 256,
+    ) -> Tuple[List[Dict[str, str]], int]:
+        usable = self.usable_tokens(model)
+        messages = [dict(m) for m in messages]
+        prompt_tokens = estimate_messages_tokens(messages)
+        original_prompt_tokens = prompt_tokens
+
+        # Trim the largest messages until the prompt leaves a sensible share of the window for the output
+        reserved_output = min(max_output_tokens, max(min_output_tokens, usable // 4))
+        while usable - prompt_tokens < reserved_output:
+            idx = max(range(len(messages)), key=lambda i: estimate_tokens(messages[i].get("content") or ""))
+            size = estimate_tokens(messages[idx].get("content") or "")
+            excess = prompt_tokens + reserved_output - usable
+            if size <= excess:
+                raise BudgetExceeded(
+                    f"{stage}: prompt of ~{prompt_tokens} tokens cannot fit the {self.context_window(model)}-token "
+                    f"context window of {model}"
+                )
+            messages[idx]["content"] = compact_text(messages[idx]["content"], size - excess)
+            prompt_tokens = estimate_messages_tokens(messages)
+
+        output_tokens = min(max_output_tokens, usable - prompt_tokens)
+        self.record(stage, model, prompt_tokens, output_tokens, original_prompt_tokens - prompt_tokens)
+        return messages, output_tokens
+
+    def record(self, stage: str, model: str, prompt_tokens: int, output_tokens: int, trimmed_tokens: int = 0) -> None:
+        entry = {
+            "model": model,
+            "prompt_tokens": prompt_tokens,
+            "max_output_tokens": output_tokens,
+            "trimmed_tokens": trimmed_tokens,
+            "context_window": self.context_window(model),
+        }
+        with self._lock:
+            self.usage.setdefault(stage, []).append(entry)
+        if trimmed_tokens:
+            logger.warning(f"[{stage}] Trimmed ~{trimmed_tokens} prompt tokens to fit the {model} context window")
+        logger.info(
+            f"[{stage}] Token budget: ~{prompt_tokens} prompt + {output_tokens} output "
+            f"of {entry['context_window']} ({model})"
+        )
+
+    def summary(self) -> Dict[str, Dict[str, int]]:
+        with self._lock:
+            return {
+                stage: {
+                    "calls": len(entries),
+                    "prompt_tokens": sum(e["prompt_tokens"] for e in entries),
+                    "max_output_tokens": sum(e["max_output_tokens"] for e in entries),
+                    "trimmed_tokens": sum(e["trimmed_tokens"] for e in entries),
+                }
+                for stage, entries in self.usage.items()
+            }
+
+    def log_summary(self) -> None:
+        for stage, totals in self.summary().items():
+            logger.info(
+                f"[{stage}] {totals['calls']} call(s), ~{totals['prompt_tokens']} prompt tokens, "
+                f"{totals['max_output_tokens']} output tokens budgeted, ~{totals['trimmed_tokens']} trimmed"
+            )
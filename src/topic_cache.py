@@ -0,0 +1,238 @@
+import os
+import re
+import json
+import math
+import time
+import logging
+import threading
+import zlib
+from collections import Counter
+from typing import Any, Dict, List, Optional, Set, Tuple
+from .output_store import atomic_write
+
+logger = logging.getLogger(__name__)
+
+NUM_FEATURES = 2 ** 18
+NGRAM_SIZES = (3, 4)
+STOPWORDS = {
+    "a", "an", "and", "for", "in", "into", "of", "on", "or", "the", "to", "with",
+    "about", "what", "how", "is", "are", "its", "their", "vs",
+}
+ABBREVIATIONS = {
+    "se": "southeast", "sw": "southwest", "ne": "northeast", "nw": "northwest",
+    "us": "united states", "usa": "united states", "uk": "united kingdom", "eu": "european union",
+    "ai": "artificial intelligence", "ml": "machine learning", "ev": "electric vehicle", "evs": "electric vehicles",
+    "renewables": "renewable energy",
+}
+# Words that frame a research question rather than say what it is about; they barely count towards a match
+FRAMING_WORDS = {
+    "impact", "impacts", "effect", "effects", "affect", "affects", "influence", "role", "future", "outlook",
+    "prospects", "trend", "trends", "state", "current", "latest", "recent", "overview", "analysis", "landscape",
+    "evolution", "development", "developments", "challenges", "opportunities", "report", "research", "study",
+    "review", "guide",
+}
+FRAMING_WEIGHT = 0.3
+STEM_LENGTH = 5
+
+# Place names and directions decide what a topic is about even when the rest of the wording matches
+PLACE_WORDS = {
+    "north", "south", "east", "west", "central", "northern", "southern", "eastern", "western",
+    "northeast", "northwest", "southeast", "southwest", "middle", "latin", "sub", "saharan",
+    "global", "world", "worldwide", "international", "domestic", "rural", "urban",
+    "asia", "asian", "africa", "african", "europe", "european", "america", "american", "americas",
+    "oceania", "pacific", "atlantic", "arctic", "antarctic", "mediterranean", "caribbean", "nordic",
+    "scandinavia", "scandinavian", "balkans", "gulf", "union", "united", "kingdom", "states",
+    "china", "chinese", "india", "indian", "japan", "japanese", "korea", "korean", "indonesia", "indonesian",
+    "vietnam", "vietnamese", "thailand", "thai", "philippines", "filipino", "malaysia", "malaysian",
+    "singapore", "pakistan", "bangladesh", "australia", "australian", "zealand", "canada", "canadian",
+    "mexico", "mexican", "brazil", "brazilian", "argentina", "chile", "colombia", "peru",
+    "germany", "german", "france", "french", "italy", "italian", "spain", "spanish", "portugal",
+    "netherlands", "dutch", "belgium", "poland", "polish", "sweden", "swedish", "norway", "norwegian",
+    "denmark", "danish", "finland", "ireland", "irish", "britain", "british", "england", "english",
+    "scotland", "scottish", "wales", "welsh", "switzerland", "swiss", "austria", "greece", "turkey",
+    "russia", "russian", "ukraine", "ukrainian", "israel", "iran", "iraq", "saudi", "arabia", "egypt",
+    "nigeria", "kenya", "ethiopia", "ghana", "morocco", "california", "texas", "york", "london",
+}
+
+
+def normalize_text(text: str) -> str:
+    text = re.sub(r"[^a-z0-9]+", " ", text.lower())
+    text = re.sub(r"\b(south|north) (east|west)\b", r"\1\2", text)
+    return " ".join(ABBREVIATIONS.get(word, word) for word in text.split())
+
+
+def decisive_terms(text: str) -> Set[str]:
+    # Places and numbers (regions, countries, years) in a text; two topics only match if these agree
+    return {
+        word for word in normalize_text(text).split()
+        if word in PLACE_WORDS or any(c.isdigit() for c in word)
+    }
+
+
+def terms_conflict(a: str, b: str) -> Set[str]:
+    return decisive_terms(a) ^ decisive_terms(b)
+
+
+def hashed_ngrams(text: str, framing_weight: float = 1.0) -> Dict[int, float]:
+    # Per-word character n-grams (order and inflection tolerant), hashed into a fixed-size sparse vector
+    counts = Counter()
+    framing = Counter()
+    for word in normalize_text(text).split():
+        if word in STOPWORDS:
+            continue
+        target = framing if word in FRAMING_WORDS else counts
+        padded = f" {word} "
+        for n in NGRAM_SIZES:
+            for i in range(max(len(padded) - n + 1, 1)):
+                target[zlib.crc32(padded[i:i + n].encode("utf-8")) % NUM_FEATURES] += 1
+    weights = {feature: 1.0 + math.log(count) for feature, count in counts.items()}
+    for feature, count in framing.items():
+        weights[feature] = weights.get(feature, 0.0) + framing_weight * (1.0 + math.log(count))
+    return weights
+
+
+def topic_vector(text: str) -> Dict[int, float]:
+    # Unit-length vector with framing words down-weighted; unlike TF-IDF it does not depend on what else is cached
+    return tfidf_vector(hashed_ngrams(text, FRAMING_WEIGHT), {}, 1.0)
+
+
+def content_stems(text: str) -> Set[str]:
+    # Crude prefix stems of the words that say what a topic is about ("batteries" and "battery" agree)
+    return {
+        word[:STEM_LENGTH] for word in normalize_text(text).split()
+        if word not in STOPWORDS and word not in FRAMING_WORDS
+    }
+
+
+def content_overlap(a: str, b: str) -> float:
+    stems_a, stems_b = content_stems(a), content_stems(b)
+    union = stems_a | stems_b
+    return len(stems_a & stems_b) / len(union) if union else 1.0
+
+
+def idf_weights(feature_sets: List[Dict[int, float]]) -> Tuple[Dict[int, float], float]:
+    doc_freq = Counter()
+    for features in feature_sets:
+        doc_freq.update(features.keys())
+    total = len(feature_sets)
+    idf = {f: math.log((1 + total) / (1 + df)) + 1.0 for f, df in doc_freq.items()}
+    return idf, math.log(1 + total) + 1.0
+
+
+def tfidf_vector(features: Dict[int, float], idf: Dict[int, float], default_idf: float) -> Dict[int, float]:
+    vector = {f: w * idf.get(f, default_idf) for f, w in features.items()}
+    norm = math.sqrt(sum(w * w for w in vector.values()))
+    if not norm:
+        return {}
+    return {f: w / norm for f, w in vector.items()}
+
+
+def cosine(a: Dict[int, float], b: Dict[int, float]) -> float:
+    if len(a) > len(b):
+        a, b = b, a
+    return sum(w * b.get(f, 0.0) for f, w in a.items())
+
+
+class TopicCache:
+    """Similarity index over past topics that returns cached stage outputs for near-duplicates."""
+
+    # Scores do not depend on the cache size. Measured paraphrases such as "future of renewables in SE Asia" /
+    # "Southeast Asia renewable energy outlook" score 0.87+, while topics sharing their framing but not their
+    # subject ("impact of AI on jobs" / "impact of AI on healthcare") score up to 0.79. The similarity alone
+    # cannot separate those, so a match must also share most content words (min_overlap) and agree on
+    # regions and years (terms_conflict).
+    def __init__(
+        self,
+        path: str = "research_outputs/topic_cache.json",
+        threshold: float = 0.7,
+        min_overlap: float = 0.75,
+    ):
+        self.path = path
+        self.threshold = threshold
+        self.min_overlap = min_overlap
+        self._lock = threading.Lock()
+        self._entries: List[Dict[str, Any]] = []
+        self._load()
+
+    def lookup(self, kind: str, topic: str) -> Optional[Any]:
+        match = self.best_match(kind, topic)
+        if match is None:
+            return None
+        entry, score = match
+        if score < self.threshold:
+            logger.info(f"No cached {kind} for topic (best similarity {score:.2f} < {self.threshold:.2f})")
+            return None
+        logger.info(f"Reusing cached {kind} from similar topic '{entry['topic']}' (similarity {score:.2f})")
+        return entry["value"]
+
+    def best_match(self, kind: str, topic: str) -> Optional[Tuple[Dict[str, Any], float]]:
+        with self._lock:
+            entries = [e for e in self._entries if e["kind"] == kind]
+            if not entries:
+                return None
+            query = topic_vector(topic)
+            scored = [(entry, cosine(query, entry["features"])) for entry in entries]
+        compatible = []
+        for entry, score in scored:
+            conflict = terms_conflict(topic, entry["topic"])
+            if conflict:
+                if score >= self.threshold:
+                    logger.info(
+                        f"Not reusing cached {kind} from '{entry['topic']}' (similarity {score:.2f}): "
+                        f"differs in {', '.join(sorted(conflict))}"
+                    )
+                continue
+            overlap = content_overlap(topic, entry["topic"])
+            if overlap < self.min_overlap:
+                if score >= self.threshold:
+                    logger.info(
+                        f"Not reusing cached {kind} from '{entry['topic']}' (similarity {score:.2f}): "
+                        f"only {overlap:.0%} of the subject words agree"
+                    )
+                continue
+            compatible.append((entry, score))
+        if not compatible:
+            return None
+        return max(compatible, key=lambda item: item[1])
+
+    def store(self, kind: str, topic: str, value: Any) -> None:
+        key = normalize_text(topic)
+        with self._lock:
+            self._entries = [
+                e for e in self._entries
+                if not (e["kind"] == kind and normalize_text(e["topic"]) == key)
+            ]
+            self._entries.append({
+                "kind": kind,
+                "topic": topic,
+                "value": value,
+                "updated_at": time.time(),
+                "features": topic_vector(topic),
+            })
+            self._save()
+
+    def _load(self) -> None:
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            for entry in data.get("entries", []):
+                entry["features"] = topic_vector(entry["topic"])
+                self._entries.append(entry)
+            logger.info(f"Loaded {len(self._entries)} cached topic entries from {self.path}")
+        except (OSError, ValueError, KeyError) as e:
+            logger.warning(f"Ignoring unreadable topic cache {self.path}: {e}")
+
+    def _save(self) -> None:
+        data = {
+            "entries": [
+                {k: v for k, v in entry.items() if k != "features"}
+                for entry in self._entries
+            ]
+        }
+        try:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            atomic_write(self.path, json.dumps(data, indent=2))
+        except OSError as e:
+            logger.error(f"Failed to save topic cache {self.path}: {e}")
@@ -0,0 +1,216 @@
+import os
+import json
+import time
+import sqlite3
+import logging
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Optional
+
+logger = logging.getLogger(__name__)
+
+PENDING = "pending"
+CLAIMED = "claimed"
+DONE = "done"
+FAILED = "failed"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS tasks (
+    run_id TEXT NOT NULL,
+    task_key TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    payload TEXT NOT NULL,
+    status TEXT NOT NULL,
+    worker_id TEXT,
+    lease_expires REAL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    result TEXT,
+    error TEXT,
+    updated_at REAL NOT NULL,
+    PRIMARY KEY (run_id, task_key)
+);
+CREATE INDEX IF NOT EXISTS idx_tasks_status ON tasks (status, lease_expires);
+"""
+
+
+class WorkQueue:
+    """SQLite-backed subtask queue that worker processes claim from under expiring leases."""
+
+    def __init__(self, path: str = "research_outputs/work_queue.db", max_attempts: int = 3):
+        self.path = path
+        self.max_attempts = max_attempts
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(SCHEMA)
+
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    @contextmanager
+    def _transaction(self) -> Iterator[sqlite3.Connection]:
+        # BEGIN IMMEDIATE takes the write lock up front so two workers can never claim the same row
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield conn
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+
+    def publish(
+        self,
+        run_id: str,
+        subtasks: List[Dict],
+        payload: Dict,
+        task_payloads: Optional[List[Dict]] = None,
+    ) -> List[str]:
+        now = time.time()
+        keys = []
+        with self._transaction() as conn:
+            for position, task in enumerate(subtasks):
+                # Subtask ids from the splitter can collide ("A" twice), so the key includes the position
+                task_key = f"{position:04d}_{task.get('id')}"
+                task_payload = dict(payload, **(task_payloads[position] if task_payloads else {}), task=task)
+                conn.execute(
+                    "INSERT OR REPLACE INTO tasks (run_id, task_key, position, payload, status, updated_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    (run_id, task_key, position, json.dumps(task_payload), PENDING, now),
+                )
+                keys.append(task_key)
+        logger.info(f"Published {len(keys)} subtasks for run {run_id} to {self.path}")
+        return keys
+
+    def claim(self, worker_id: str, lease_seconds: float = 120) -> Optional[Dict]:
+        now = time.time()
+        with self._transaction() as conn:
+            while True:
+                row = conn.execute(
+                    "SELECT * FROM tasks WHERE status = ? OR (status = ? AND lease_expires < ?) "
+                    "ORDER BY updated_at, position LIMIT 1",
+                    (PENDING, CLAIMED, now),
+                ).fetchone()
+                if row is None:
+                    return None
+                if row["status"] != CLAIMED:
+                    break
+                logger.warning(f"Lease of {row['worker_id']} on {row['run_id']}/{row['task_key']} expired; reclaiming")
+                if row["attempts"] < self.max_attempts:
+                    break
+                # Out of attempts: fail it and look for the next claimable row in the same transaction
+                conn.execute(
+                    "UPDATE tasks SET status = ?, error = ?, updated_at = ? WHERE run_id = ? AND task_key = ?",
+                    (FAILED, f"Lease expired after {row['attempts']} attempts", now, row["run_id"], row["task_key"]),
+                )
+            conn.execute(
+                "UPDATE tasks SET status = ?, worker_id = ?, lease_expires = ?, attempts = attempts + 1, updated_at = ? "
+                "WHERE run_id = ? AND task_key = ?",
+                (CLAIMED, worker_id, now + lease_seconds, now, row["run_id"], row["task_key"]),
+            )
+        return {
+            "run_id": row["run_id"],
+            "task_key": row["task_key"],
+            "attempt": row["attempts"] + 1,
+            **json.loads(row["payload"]),
+        }
+
+    def heartbeat(self, run_id: str, task_key: str, worker_id: str, lease_seconds: float = 120) -> bool:
+        now = time.time()
+        with self._transaction() as conn:
+            cursor = conn.execute(
+                "UPDATE tasks SET lease_expires = ?, updated_at = ? "
+                "WHERE run_id = ? AND task_key = ? AND worker_id = ? AND status = ?",
+                (now + lease_seconds, now, run_id, task_key, worker_id, CLAIMED),
+            )
+        return cursor.rowcount == 1
+
+    def complete(self, run_id: str, task_key: str, worker_id: str, result: str) -> bool:
+        with self._transaction() as conn:
+            cursor = conn.execute(
+                "UPDATE tasks SET status = ?, result = ?, error = NULL, lease_expires = NULL, updated_at = ? "
+                "WHERE run_id = ? AND task_key = ? AND worker_id = ? AND status = ?",
+                (DONE, result, time.time(), run_id, task_key, worker_id, CLAIMED),
+            )
+        if cursor.rowcount != 1:
+            logger.warning(f"Worker {worker_id} lost its lease on {run_id}/{task_key}; result discarded")
+        return cursor.rowcount == 1
+
+    def fail(self, run_id: str, task_key: str, worker_id: str, error: str) -> None:
+        with self._transaction() as conn:
+            row = conn.execute(
+                "SELECT attempts FROM tasks WHERE run_id = ? AND task_key = ? AND worker_id = ? AND status = ?",
+                (run_id, task_key, worker_id, CLAIMED),
+            ).fetchone()
+            if row is None:
+                return
+            status = PENDING if row["attempts"] < self.max_attempts else FAILED
+            conn.execute(
+                "UPDATE tasks SET status = ?, error = ?, worker_id = NULL, lease_expires = NULL, updated_at = ? "
+                "WHERE run_id = ? AND task_key = ?",
+                (status, error, time.time(), run_id, task_key),
+            )
+
+    def results(self, run_id: str) -> List[Dict]:
+        with self._connect() as conn:
+            rows = conn.execute("SELECT * FROM tasks WHERE run_id = ? ORDER BY position", (run_id,)).fetchall()
+        return [
+            {
+                "task_key": row["task_key"],
+                "position": row["position"],
+                "task": json.loads(row["payload"])["task"],
+                "status": row["status"],
+                "result": row["result"],
+                "error": row["error"],
+                "worker_id": row["worker_id"],
+            }
+            for row in rows
+        ]
+
+    def watch(
+        self,
+        run_id: str,
+        timeout: Optional[float] = None,
+        poll_interval: float = 2.0,
+        stop: Optional[Callable[[], bool]] = None,
+    ) -> Iterator[Dict]:
+        # Yields each task row once, as soon as it is done or has finally failed
+        start = time.monotonic()
+        seen = set()
+        while True:
+            rows = self.results(run_id)
+            finished = [r for r in rows if r["status"] in (DONE, FAILED)]
+            for row in finished:
+                if row["task_key"] not in seen:
+                    seen.add(row["task_key"])
+                    logger.info(f"Run {run_id}: {len(seen)}/{len(rows)} subtasks finished")
+                    yield row
+            if len(finished) == len(rows):
+                return
+            if (timeout is not None and time.monotonic() - start >= timeout) or (stop and stop()):
+                logger.warning(f"Run {run_id}: stopped waiting with {len(rows) - len(finished)} subtasks unfinished")
+                return
+            time.sleep(poll_interval)
+
+    def wait(
+        self,
+        run_id: str,
+        timeout: Optional[float] = None,
+        poll_interval: float = 2.0,
+        stop: Optional[Callable[[], bool]] = None,
+    ) -> List[Dict]:
+        for _ in self.watch(run_id, timeout, poll_interval, stop):
+            pass
+        return self.results(run_id)
+
+    def cancel(self, run_id: str) -> None:
+        with self._transaction() as conn:
+            conn.execute(
+                "UPDATE tasks SET status = ?, error = ?, updated_at = ? WHERE run_id = ? AND status IN (?, ?)",
+                (FAILED, "Cancelled", time.time(), run_id, PENDING, CLAIMED),
+            )
@@ -0,0 +1,122 @@
+import os
+import time
+import socket
+import logging
+import argparse
+import threading
+import uuid
+from typing import Optional
+from .work_queue import WorkQueue
+from .coordinator import Coordinator
+from .router import LatencyStats
+from .endpoint_health import EndpointHealth
+from .deadline import Deadline
+
+logger = logging.getLogger(__name__)
+
+
+class Worker:
+    """Claims subtasks from a shared WorkQueue, runs them as sub-agents and heartbeats while they run."""
+
+    def __init__(
+        self,
+        coordinator: Coordinator,
+        queue: WorkQueue,
+        worker_id: Optional[str] = None,
+        lease_seconds: float = 120,
+        poll_interval: float = 2.0,
+    ):
+        self.coordinator = coordinator
+        self.queue = queue
+        self.worker_id = worker_id or f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:6]}"
+        self.lease_seconds = lease_seconds
+        self.poll_interval = poll_interval
+
+    def run(self, stop_when_idle: bool = False) -> None:
+        logger.info(f"Worker {self.worker_id} polling {self.queue.path}")
+        while True:
+            job = self.queue.claim(self.worker_id, self.lease_seconds)
+            if job is None:
+                if stop_when_idle:
+                    logger.info(f"Worker {self.worker_id} found no work; exiting")
+                    return
+                time.sleep(self.poll_interval)
+                continue
+            self.run_job(job)
+
+    def run_job(self, job: dict) -> None:
+        run_id, task_key = job["run_id"], job["task_key"]
+        logger.info(f"Worker {self.worker_id} claimed {run_id}/{task_key} (attempt {job['attempt']})")
+
+        # Cancelled when the lease is lost (expired, reclaimed or the run was cancelled) so searches stop early
+        deadline = Deadline()
+        stop = threading.Event()
+        heartbeat = threading.Thread(target=self._heartbeat, args=(run_id, task_key, stop, deadline), daemon=True)
+        heartbeat.start()
+        model_id = job.get("model_id") or self.coordinator.subagent_model_id
+        outcome = {}
+
+        def research() -> None:
+            try:
+                outcome["finding"] = self.coordinator.run_subtask(
+                    user_query=job["user_query"],
+                    research_plan=job["research_plan"],
+                    task=job["task"],
+                    model_id=model_id,
+                    deadline=deadline,
+                )
+            except Exception as e:
+                outcome["error"] = e
+
+        # Daemon thread so a lost lease lets the worker move on even while a model call is still in flight
+        subagent = threading.Thread(target=research, name=f"subagent-{task_key}", daemon=True)
+        subagent.start()
+        try:
+            while subagent.is_alive() and not deadline.expired():
+                subagent.join(self.poll_interval)
+            if deadline.expired():
+                # Someone else owns the subtask now (or the run is gone); its result would be discarded anyway
+                logger.warning(f"Worker {self.worker_id} abandoning {run_id}/{task_key}: {deadline.reason}")
+                self.coordinator.interrupt_subagents()
+                return
+            if "error" in outcome:
+                e = outcome["error"]
+                logger.error(f"Worker {self.worker_id} failed {run_id}/{task_key}: {e}")
+                self.queue.fail(run_id, task_key, self.worker_id, str(e))
+                return
+            if self.queue.complete(run_id, task_key, self.worker_id, outcome["finding"]):
+                logger.info(f"Worker {self.worker_id} completed {run_id}/{task_key}")
+        finally:
+            stop.set()
+            heartbeat.join()
+
+    def _heartbeat(self, run_id: str, task_key: str, stop: threading.Event, deadline: Deadline) -> None:
+        # Renew the lease well before it expires; a crashed worker simply stops renewing
+        while not stop.wait(self.lease_seconds / 3):
+            if not self.queue.heartbeat(run_id, task_key, self.worker_id, self.lease_seconds):
+                logger.warning(f"Worker {self.worker_id} lost its lease on {run_id}/{task_key}")
+                deadline.cancel(f"lease on {run_id}/{task_key} lost")
+                return
+
+
+if __name__ == "__main__":
+    from dotenv import load_dotenv
+    load_dotenv()
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    parser = argparse.ArgumentParser(description="Run research sub-agents from a shared work queue.")
+    parser.add_argument("--queue", default=os.getenv("WORK_QUEUE", "research_outputs/work_queue.db"))
+    parser.add_argument("--subagent-model", default="MiniMaxAI/MiniMax-M1-80k")
+    parser.add_argument("--fallback-model", action="append", default=[], help="Fallback for the sub-agent model; repeatable.")
+    parser.add_argument("--lease", type=float, default=120, help="Lease duration in seconds.")
+    parser.add_argument("--once", action="store_true", help="Exit when the queue has no claimable work.")
+    args = parser.parse_args()
+
+    health = EndpointHealth(fallbacks={args.subagent_model: args.fallback_model})
+    # Latency samples go to the queue database, where the coordinator's router reads them
+    coordinator = Coordinator(
+        subagent_model_id=args.subagent_model, hf_key=os.getenv("HF_KEY"), health=health,
+        latency_stats=LatencyStats(args.queue),
+    )
+    worker = Worker(coordinator, WorkQueue(args.queue), lease_seconds=args.lease)
+    worker.run(stop_when_idle=args.once)
@@ -0,0 +1,22 @@
+from src.research_store import ResearchStore
+
+
+def _store(tmp_path):
+    store = ResearchStore(path=str(tmp_path / "research_store.db"))
+    subtasks = [{"id": "A", "title": "AI job displacement statistics in the UK", "description": "Collect figures on jobs lost to automation in the UK."}]
+    store.save_run("run-uk", "impact of AI on jobs in the UK", "plan", subtasks)
+    store.save_finding("run-uk", 0, subtasks[0], "UK finding")
+    return store
+
+
+def test_us_topic_never_reuses_uk_finding(tmp_path):
+    store = _store(tmp_path)
+    subtasks = [{"id": "A", "title": "AI job displacement statistics in the US", "description": "Collect figures on jobs lost to automation in the US."}]
+    assert store.match("impact of AI on jobs in the US", subtasks) == {}
+
+
+def test_same_topic_reuses_finding(tmp_path):
+    store = _store(tmp_path)
+    subtasks = [{"id": "1", "title": "AI job displacement statistics in the UK", "description": "Collect figures on jobs lost to automation in the UK."}]
+    matches = store.match("impact of AI on jobs in the UK", subtasks)
+    assert matches[0]["finding"] == "UK finding"
@@ -0,0 +1,26 @@
+from src.streaming import is_restart, stitch
+
+SUBTASK_A = '{"id": "A", "title": "Market size", "description": "Estimate the market size."}'
+SUBTASK_B = '{"id": "B", "title": "Key players", "description": "List the key players."}'
+PLAN_HEAD = "# Research Plan: EV adoption in Europe\n\n## 1. Market size\nEstimate the market size.\n\n"
+
+
+def test_cut_between_array_items_is_continued():
+    partial = '{"subtasks": [' + SUBTASK_A + ", "
+    continuation = SUBTASK_B + "]}"
+    assert not is_restart(partial, continuation)
+    assert stitch(partial, continuation) == partial + continuation
+
+
+def test_cut_before_heading_is_continued():
+    continuation = "# 2. Key players\nList the key players.\n"
+    assert not is_restart(PLAN_HEAD, continuation)
+    assert stitch(PLAN_HEAD, continuation) == PLAN_HEAD + continuation
+
+
+def test_repeated_opening_is_a_restart():
+    partial = '{"subtasks": [' + SUBTASK_A + ", "
+    continuation = '{\n  "subtasks": [\n    ' + SUBTASK_A + ", " + SUBTASK_B + "]}"
+    assert is_restart(partial, continuation)
+    assert stitch(partial, continuation) == continuation
+    assert is_restart(PLAN_HEAD, "<think>Let me plan this.</think>" + PLAN_HEAD)
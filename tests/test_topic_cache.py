@@ -0,0 +1,28 @@
+from src.topic_cache import TopicCache
+
+TOPICS = [
+    "impact of AI on jobs",
+    "history of the roman empire",
+    "lithium battery recycling",
+    "quantum computing applications in finance",
+    "future of renewables in SE Asia",
+]
+
+
+def _cache(tmp_path):
+    cache = TopicCache(path=str(tmp_path / "topic_cache.json"))
+    for topic in TOPICS:
+        cache.store("plan", topic, f"plan for {topic}")
+    return cache
+
+
+def test_paraphrase_hits_full_cache(tmp_path):
+    cache = _cache(tmp_path)
+    assert cache.lookup("plan", "Southeast Asia renewable energy outlook") == "plan for future of renewables in SE Asia"
+    assert cache.lookup("plan", "recycling lithium batteries") == "plan for lithium battery recycling"
+
+
+def test_different_subject_misses_full_cache(tmp_path):
+    cache = _cache(tmp_path)
+    assert cache.lookup("plan", "impact of AI on healthcare") is None
+    assert cache.lookup("plan", "quantum computing applications in drug discovery") is None